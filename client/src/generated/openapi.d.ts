@@ -46,7 +46,10 @@ export interface paths {
             path?: never;
             cookie?: never;
         };
-        /** Get Tasks */
+        /**
+         * Get Tasks
+         * @description Newest tasks first. With a limit, a full page sets the X-Next-Cursor header to pass back as cursor.
+         */
         get: operations["get_tasks_project__project_id__tasks_get"];
         put?: never;
         post?: never;
@@ -114,7 +117,11 @@ export interface paths {
             path?: never;
             cookie?: never;
         };
-        /** Get Messages */
+        /**
+         * Get Messages
+         * @description Oldest messages first. after is a message id the client already has; with a limit, a full page
+         *     sets the X-Next-Cursor header to pass back as cursor.
+         */
         get: operations["get_messages_task__task_id__messages_get"];
         put?: never;
         /** Create Message */
@@ -220,6 +227,38 @@ export interface components {
             /** Insert Text */
             insert_text: string;
         };
+        /** JobOutputCommand */
+        JobOutputCommand: {
+            /**
+             * @description discriminator enum property added by openapi-typescript
+             * @enum {string}
+             */
+            operation: "output";
+            /** Job Id */
+            job_id?: string | null;
+            /**
+             * Offset
+             * @default 0
+             */
+            offset: number;
+            /** Max Bytes */
+            max_bytes?: number | null;
+        };
+        /** JobStatusCommand */
+        JobStatusCommand: {
+            /**
+             * @description discriminator enum property added by openapi-typescript
+             * @enum {string}
+             */
+            operation: "status";
+            /** Job Id */
+            job_id?: string | null;
+            /**
+             * Wait Seconds
+             * @default 0
+             */
+            wait_seconds: number;
+        };
         /** MessageCreate */
         MessageCreate: {
             /** Text */
@@ -270,6 +309,18 @@ export interface components {
             /** Setup Script Path */
             setup_script_path: string;
         };
+        /** StartJobCommand */
+        StartJobCommand: {
+            /**
+             * @description discriminator enum property added by openapi-typescript
+             * @enum {string}
+             */
+            operation: "start";
+            /** Command */
+            command?: string | null;
+            /** Description */
+            description?: string | null;
+        };
         /** StrReplaceCommand */
         StrReplaceCommand: {
             /**
@@ -357,9 +408,27 @@ export interface components {
             tool_input: components["schemas"]["BashToolInput"];
         };
         /** ToolInputBlock */
-        "ToolInputBlock-Input": components["schemas"]["ToolInputBash"] | components["schemas"]["ToolInputTextEditor"] | components["schemas"]["ToolInputSetup"];
+        "ToolInputBlock-Input": components["schemas"]["ToolInputBash"] | components["schemas"]["ToolInputTextEditor"] | components["schemas"]["ToolInputJob"] | components["schemas"]["ToolInputSetup"];
         /** ToolInputBlock */
-        "ToolInputBlock-Output": components["schemas"]["ToolInputBash"] | components["schemas"]["ToolInputTextEditor"] | components["schemas"]["ToolInputSetup"];
+        "ToolInputBlock-Output": components["schemas"]["ToolInputBash"] | components["schemas"]["ToolInputTextEditor"] | components["schemas"]["ToolInputJob"] | components["schemas"]["ToolInputSetup"];
+        /** ToolInputJob */
+        ToolInputJob: {
+            /**
+             * Type
+             * @default tool_input
+             * @constant
+             */
+            type: "tool_input";
+            /** Tool Id */
+            tool_id: string;
+            /**
+             * @description discriminator enum property added by openapi-typescript
+             * @enum {string}
+             */
+            tool_name: "job";
+            /** Tool Input */
+            tool_input: components["schemas"]["StartJobCommand"] | components["schemas"]["JobStatusCommand"] | components["schemas"]["JobOutputCommand"];
+        };
         /** ToolInputSetup */
         ToolInputSetup: {
             /**
@@ -396,6 +465,24 @@ export interface components {
             /** Tool Input */
             tool_input: components["schemas"]["ViewCommand"] | components["schemas"]["StrReplaceCommand"] | components["schemas"]["CreateCommand"] | components["schemas"]["InsertCommand"];
         };
+        /** ToolOutputDeltaEvent */
+        ToolOutputDeltaEvent: {
+            /**
+             * Type
+             * @default tool_output_delta
+             * @constant
+             */
+            type: "tool_output_delta";
+            /** Tool Id */
+            tool_id: string;
+            /** Output */
+            output: string;
+            /**
+             * Truncated
+             * @default false
+             */
+            truncated: boolean;
+        };
         /** ToolResultBlock */
         ToolResultBlock: {
             /**
@@ -532,7 +619,10 @@ export interface operations {
     };
     get_tasks_project__project_id__tasks_get: {
         parameters: {
-            query?: never;
+            query?: {
+                limit?: number | null;
+                cursor?: string | null;
+            };
             header?: never;
             path: {
                 project_id: string;
@@ -628,7 +718,9 @@ export interface operations {
     read_events_task__task_id__events_post: {
         parameters: {
             query?: never;
-            header?: never;
+            header?: {
+                "last-event-id"?: string | null;
+            };
             path: {
                 task_id: string;
             };
@@ -642,7 +734,7 @@ export interface operations {
                     [name: string]: unknown;
                 };
                 content: {
-                    "application/json": components["schemas"]["MessageStartEvent"] | components["schemas"]["MessageStopEvent"] | components["schemas"]["ErrorEvent"] | components["schemas"]["ToolInputBlock-Output"] | components["schemas"]["ToolResultBlock"] | components["schemas"]["TextDeltaEvent"];
+                    "application/json": components["schemas"]["MessageStartEvent"] | components["schemas"]["MessageStopEvent"] | components["schemas"]["ErrorEvent"] | components["schemas"]["ToolInputBlock-Output"] | components["schemas"]["ToolResultBlock"] | components["schemas"]["TextDeltaEvent"] | components["schemas"]["ToolOutputDeltaEvent"];
                 };
             };
             /** @description Validation Error */
@@ -658,7 +750,11 @@ export interface operations {
     };
     get_messages_task__task_id__messages_get: {
         parameters: {
-            query?: never;
+            query?: {
+                limit?: number | null;
+                cursor?: string | null;
+                after?: string | null;
+            };
             header?: never;
             path: {
                 task_id: string;
@@ -1,11 +1,18 @@
 import uvicorn
 from .settings import config
+from .task.settings import config as task_config
+
+
+def _check_workers() -> None:
+    if config.workers > 1 and task_config.event_bus != "postgres":
+        raise ValueError("API_WORKERS above 1 needs API_EVENT_BUS=postgres so every worker sees every task's events")
 
 
 def main() -> None:
+    _check_workers()
     uvicorn.run(
         "api.app:get_app",
-        workers=1,
+        workers=config.workers,
         host="0.0.0.0",
         port=8000,
         reload=config.is_local,
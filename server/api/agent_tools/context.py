@@ -0,0 +1,93 @@
+import json
+from typing import Any
+from anthropic.types import MessageParam
+
+CHARS_PER_TOKEN = 4
+ELIDED_KEEP_CHARS = 400
+
+
+def _block_chars(block: Any) -> int:
+    if not isinstance(block, dict):
+        block = block.model_dump()
+    if block["type"] == "text":
+        return len(block["text"])
+    if block["type"] == "tool_use":
+        return len(json.dumps(block["input"]))
+    if block["type"] == "tool_result":
+        return _content_chars(block.get("content", ""))
+    return len(json.dumps(block, default=str))
+
+
+def _content_chars(content: Any) -> int:
+    if isinstance(content, str):
+        return len(content)
+    return sum(_block_chars(block) for block in content)
+
+
+def estimate_tokens(messages: list[MessageParam]) -> int:
+    return sum(_content_chars(message["content"]) for message in messages) // CHARS_PER_TOKEN
+
+
+def _elide(text: str) -> str:
+    elided = len(text) - 2 * ELIDED_KEEP_CHARS
+    return (
+        f"{text[:ELIDED_KEEP_CHARS]}\n"
+        f"[... {elided} characters of this earlier tool output were elided to save context; rerun the tool if you need them ...]\n"
+        f"{text[-ELIDED_KEEP_CHARS:]}"
+    )
+
+
+def _result_text(block: dict[str, Any]) -> str | None:
+    content = block.get("content", "")
+    if isinstance(content, str):
+        return content
+    if all(isinstance(part, dict) and part.get("type") == "text" for part in content):
+        return "".join(part["text"] for part in content)
+    return None
+
+
+def compact_messages(
+    messages: list[MessageParam],
+    budget_tokens: int,
+    target_tokens: int,
+    keep_recent_messages: int,
+) -> tuple[list[MessageParam], int]:
+    """Elide old tool results once the history is over budget_tokens, oldest first, until it is
+    under target_tokens.
+
+    Only tool_result contents shrink; every block stays in place, so each tool_use keeps its
+    tool_result and the most recent messages are untouched. Changed messages are copied rather
+    than modified, since the caller's list shares message dicts with the history cache and the
+    originals stay in the database. Stopping well under the budget means compaction, which
+    invalidates the prompt cache from the first changed message on, happens rarely.
+
+    Returns the (possibly new) message list and how many tool results were elided.
+    """
+    tokens = estimate_tokens(messages)
+    if tokens <= budget_tokens:
+        return messages, 0
+
+    compacted = list(messages)
+    elided = 0
+    for index in range(max(len(compacted) - keep_recent_messages, 0)):
+        if tokens <= target_tokens:
+            break
+        message = compacted[index]
+        if isinstance(message["content"], str):
+            continue
+        blocks: list[Any] = list(message["content"])
+        changed = False
+        for block_index, block in enumerate(blocks):
+            if not isinstance(block, dict) or block.get("type") != "tool_result":
+                continue
+            text = _result_text(block)
+            if text is None or len(text) <= 3 * ELIDED_KEEP_CHARS:
+                continue
+            short = _elide(text)
+            blocks[block_index] = {**block, "content": short}
+            tokens -= (len(text) - len(short)) // CHARS_PER_TOKEN
+            changed = True
+            elided += 1
+        if changed:
+            compacted[index] = {"role": message["role"], "content": blocks}
+    return compacted, elided
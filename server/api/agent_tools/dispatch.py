@@ -0,0 +1,92 @@
+import asyncio
+import posixpath
+from typing import AsyncGenerator, Literal, NamedTuple
+from anthropic.types import ToolResultBlockParam
+from .tools import AgentToolbox
+from .models import ToolInputBlock
+from api.task.settings import REPO_PATH
+
+
+class ToolAccess(NamedTuple):
+    kind: Literal["read", "write", "bash"]
+    path: str | None = None
+
+
+def classify(tool_call: ToolInputBlock) -> ToolAccess:
+    """Job status and output only read spool files; bash, job starts and unknown tools may touch any file"""
+    root = tool_call.root
+    if root.tool_name == "str_replace_based_edit_tool":
+        path = posixpath.normpath(posixpath.join(REPO_PATH, root.tool_input.path))
+        return ToolAccess("read" if root.tool_input.command == "view" else "write", path)
+    if root.tool_name == "job" and root.tool_input.operation != "start":
+        return ToolAccess("read")
+    return ToolAccess("bash")
+
+
+def conflicts(earlier: ToolAccess, later: ToolAccess) -> bool:
+    """Whether later must wait for earlier to finish to see the effects it would have seen run in order"""
+    if earlier.kind == "bash" and later.kind == "bash":
+        return False
+    if earlier.kind == "bash" or later.kind == "bash":
+        return True
+    if earlier.kind == "read" and later.kind == "read":
+        return False
+    return _overlaps(earlier.path, later.path)
+
+
+def _overlaps(path: str | None, other: str | None) -> bool:
+    """Whether one path is the other or inside it, e.g. a directory view and a write to a file in it"""
+    if path is None or other is None:
+        return False
+    return posixpath.commonpath([path, other]) in (path, other)
+
+
+class ToolDispatcher:
+    """Runs one assistant turn's tool calls, starting each as soon as the model has emitted it.
+
+    Calls run concurrently unless they conflict with an earlier call of the same turn: file
+    views run side by side, edits to one path are serialized, bash commands run side by side
+    on the executor's session pool but wait for (and hold back) file tool calls dispatched
+    around them, since they may touch any file. Results are handed back in dispatch order.
+    """
+
+    def __init__(self, toolbox: AgentToolbox):
+        self.toolbox = toolbox
+        self._runs: dict[str, asyncio.Task[ToolResultBlockParam]] = {}
+        self._calls: list[tuple[ToolInputBlock, ToolAccess]] = []
+
+    def is_dispatched(self, tool_id: str) -> bool:
+        return tool_id in self._runs
+
+    def dispatch(self, tool_call: ToolInputBlock) -> None:
+        access = classify(tool_call)
+        waits_for = [
+            self._runs[earlier_call.tool_id]
+            for earlier_call, earlier_access in self._calls
+            if conflicts(earlier_access, access)
+        ]
+        self._calls.append((tool_call, access))
+        self._runs[tool_call.tool_id] = asyncio.create_task(self._run(tool_call, waits_for))
+
+    async def results(self) -> AsyncGenerator[tuple[ToolInputBlock, ToolResultBlockParam], None]:
+        """Each call with its result, in dispatch order, as soon as that result is ready"""
+        for tool_call, _ in self._calls:
+            yield tool_call, await self._runs[tool_call.tool_id]
+
+    def cancel(self) -> None:
+        for run in self._runs.values():
+            run.cancel()
+
+    async def _run(self, tool_call: ToolInputBlock, waits_for: list[asyncio.Task[ToolResultBlockParam]]) -> ToolResultBlockParam:
+        if waits_for:
+            await asyncio.wait(waits_for)
+        try:
+            return await self.toolbox.execute_tool(tool_call)
+        except Exception as e:
+            print("ERROR EXECUTING TOOL: ", e)
+            return ToolResultBlockParam(
+                type="tool_result",
+                tool_use_id=tool_call.tool_id,
+                content=f"Error: {str(e)}",
+                is_error=True,
+            )
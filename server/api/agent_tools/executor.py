@@ -1,93 +1,363 @@
 import asyncio
-from typing import Any
+import base64
+import re
+import shlex
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Callable, NamedTuple
 import nanoid
 from e2b_code_interpreter import AsyncSandbox, CommandExitException, AsyncCommandHandle, NotFoundException
 import api.task.service as task_service
+from api.task.heartbeat_service import heartbeat_tracker
 from sqlmodel.ext.asyncio.session import AsyncSession
 from api.task.settings import config, REPO_PATH
 
+JOBS_PATH = "/tmp/fleet-jobs"
+JOB_ID_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+class JobStatus(NamedTuple):
+    job_id: str
+    exit_code: int | None
+    output_bytes: int
+
+
+class JobOutput(NamedTuple):
+    status: JobStatus
+    offset: int
+    next_offset: int
+    text: str
+
+
+class CompletionScanner:
+    """Picks one command's output and exit code out of a shell's stdout, chunk by chunk.
+
+    The command is framed by a begin line and an end line carrying its exit status, both tagged
+    with a marker unique to the command. Output before the begin frame (late output of an
+    earlier command) and after the end frame is dropped. A frame may be split across chunks
+    anywhere, so a tail that could be the start of one is held back until the next chunk
+    settles it; each character is scanned a bounded number of times.
+    """
+
+    def __init__(self, marker: str):
+        self.begin_frame = f"{marker}:begin\n"
+        self.end_frame = f"{marker}:end:"
+        self.started = False
+        self.complete = False
+        self.exit_code: int | None = None
+        self._ended = False
+        self._held = ""
+        self._status = ""
+
+    def frame(self, command: str) -> str:
+        """command wrapped to print the frames this scanner looks for, ready for the shell's stdin.
+
+        The command runs in a brace group (not a subshell, so cd and exports persist) with stdin from
+        /dev/null, so a command that reads stdin can't swallow the end frame queued behind it. The end
+        frame needn't start a line, so output without a trailing newline stays as it was.
+        """
+        return f"printf '%s\\n' '{self.begin_frame[:-1]}'\n{{\n{command}\n}} </dev/null\nprintf '%s%d\\n' '{self.end_frame}' $?\n"
+
+    def feed(self, chunk: str) -> str:
+        """The part of chunk that is command output"""
+        if self.complete:
+            return ""
+        text, self._held = self._held + chunk, ""
+        if not self.started:
+            index = text.find(self.begin_frame)
+            if index < 0:
+                self._held = text[len(text) - _partial_frame_length(text, self.begin_frame):]
+                return ""
+            self.started = True
+            text = text[index + len(self.begin_frame):]
+        output = ""
+        if not self._ended:
+            index = text.find(self.end_frame)
+            if index < 0:
+                held = _partial_frame_length(text, self.end_frame)
+                self._held = text[len(text) - held:]
+                return text[:len(text) - held]
+            self._ended = True
+            output, text = text[:index], text[index + len(self.end_frame):]
+        status, newline, _ = text.partition("\n")
+        self._status += status
+        if newline:
+            self.exit_code = int(self._status) if self._status.isdigit() else None
+            self.complete = True
+        return output
+
+
+def _partial_frame_length(text: str, frame: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of frame"""
+    start = max(len(text) - len(frame) + 1, 0)
+    while (start := text.find(frame[0], start)) >= 0:
+        if frame.startswith(text[start:]):
+            return len(text) - start
+        start += 1
+    return 0
+
+
+class BashSession:
+    """One background /bin/bash in the sandbox, with its own output buffer and completion scanner"""
+    command: AsyncCommandHandle | None
+
+    def __init__(self, sbx: AsyncSandbox, task_id: int, generation: int):
+        self.sbx = sbx
+        self.task_id = task_id
+        self.generation = generation
+        self.command = None
+        self.output_buffer: list[str] = []
+        self.command_complete_event = asyncio.Event()
+        self.scanner: CompletionScanner | None = None
+        self.on_output: Callable[[str], None] | None = None
+        self.last_output_at = time.monotonic()
+        self.timed_out = False
+
+    @property
+    def alive(self) -> bool:
+        return self.command is not None and self.command.exit_code is None
+
+    @property
+    def exit_code(self) -> int | None:
+        """Exit status of the last command run, None if it didn't finish"""
+        return self.scanner.exit_code if self.scanner else None
+
+    async def start(self) -> None:
+        self.command = await self.sbx.commands.run(
+            "/bin/bash",
+            background=True,
+            on_stdout=self._on_stdout,
+            on_stderr=self._on_stderr,
+            # cwd=REPO_PATH # errors for some reason
+        )
+        self.output_buffer = []
+        self.command_complete_event.clear()
+        self.scanner = None
+        self.timed_out = False
+        await self._enter_repo()
+
+    async def _enter_repo(self) -> None:
+        """Start where the agent was told it starts; harmless before the clone"""
+        assert self.command is not None
+        await self.sbx.commands.send_stdin(self.command.pid, f"cd {REPO_PATH} 2>/dev/null\n", request_timeout=5)
+
+    async def attach(self, pid: int) -> None:
+        self.command = await self.sbx.commands.connect(
+            pid,
+            on_stdout=self._on_stdout,
+            on_stderr=self._on_stderr,
+        )
+
+    async def retire(self) -> None:
+        """Stop listening to a shell that is still busy with a command; the process keeps running"""
+        self.scanner = None
+        self.output_buffer = []
+        if self.command:
+            await self.command.disconnect()
+
+    async def kill(self) -> None:
+        """End a shell that is no longer part of the pool, so a reconnect can't attach it again"""
+        command, self.command = self.command, None
+        self.scanner = None
+        self.output_buffer = []
+        if command:
+            await command.disconnect()
+            await self.sbx.commands.kill(command.pid)
+
+    def _on_stdout(self, output: str) -> None:
+        if self.scanner and not self.scanner.complete:
+            self.last_output_at = time.monotonic()
+            output = self.scanner.feed(output)
+            self._record(output)
+            if self.scanner.complete:
+                self.command_complete_event.set()
+
+    def _on_stderr(self, output: str) -> None:
+        if self.scanner and self.scanner.started and not self.scanner.complete:
+            self.last_output_at = time.monotonic()
+            self._record(output)
+
+    def _record(self, output: str) -> None:
+        heartbeat_tracker.record(self.task_id)
+        if output:
+            self.output_buffer.append(output)
+            if self.on_output:
+                self.on_output(output)
+
+    async def run(
+        self,
+        command: str,
+        idle_timeout_seconds: float = config.bash_idle_timeout_seconds,
+        max_timeout_seconds: float = config.bash_max_timeout_seconds,
+        on_output: Callable[[str], None] | None = None,
+    ) -> str:
+        """Run command in this shell; on_output, if given, also sees each chunk as it arrives.
+
+        The command may run for up to max_timeout_seconds as long as it keeps producing output,
+        so installs and test runs that report progress finish, while a silent hang gives up after
+        idle_timeout_seconds. The exit status is left in exit_code.
+        """
+        if not self.alive:
+            print("COMMAND EXITED, RESTARTING")
+            await self.start()
+        assert self.command is not None
+
+        scanner = CompletionScanner(f"FLEET_{nanoid.generate()}")
+        self.on_output = on_output
+        self.output_buffer = []
+        self.command_complete_event.clear()
+        self.scanner = scanner
+        started_at = self.last_output_at = time.monotonic()
+        framed_command = scanner.frame(command)
+        try:
+            await self.sbx.commands.send_stdin(self.command.pid, framed_command, request_timeout=5)
+        except NotFoundException:
+            print("COMMAND NOT FOUND, RESTARTING")
+            await self.start()
+            assert self.command is not None
+            self.scanner = scanner
+            await self.sbx.commands.send_stdin(self.command.pid, framed_command, request_timeout=5)
+        try:
+            while not self.command_complete_event.is_set():
+                now = time.monotonic()
+                if now >= started_at + max_timeout_seconds:
+                    reason = f"timed out after {max_timeout_seconds:g} seconds"
+                elif now >= self.last_output_at + idle_timeout_seconds:
+                    reason = f"produced no output for {idle_timeout_seconds:g} seconds"
+                else:
+                    deadline = min(started_at + max_timeout_seconds, self.last_output_at + idle_timeout_seconds)
+                    try:
+                        await asyncio.wait_for(self.command_complete_event.wait(), timeout=deadline - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self.timed_out = True
+                output = "".join(self.output_buffer).strip()
+                return f"{output}\nError: Command {reason}. It may still be running; use the job tool for long-running commands".lstrip()
+        finally:
+            self.on_output = None
+        return "".join(self.output_buffer).strip()
 
 
 class SandboxExecutor:
+    """A task's sandbox plus a pool of bash sessions, so several commands can run at once.
+
+    Sessions are created on demand up to the configured pool size and checked out for one
+    command at a time. A session whose shell died is restarted at checkout; one that timed out
+    is retired (its process keeps running, e.g. a dev server) and its slot is refilled.
+    """
     sbx: AsyncSandbox
-    command: AsyncCommandHandle
-    
-    def __init__(self, task_id: int, session: AsyncSession, reconnect_sandbox_id: str | None = None):
+
+    def __init__(self, task_id: int, session: AsyncSession, reconnect_sandbox_id: str | None = None, pool_size: int = config.bash_sessions_per_sandbox):
         self.task_id = task_id
         self.session = session
-        self.output_buffer: list[str] = []
-        self.command_complete_event = asyncio.Event()
-        self.current_marker: str | None = None
         self.reconnect_sandbox_id: str | None = reconnect_sandbox_id
+        self.pool_size = pool_size
+        self._generation = 0
+        self._sessions: list[BashSession] = []
+        self._idle: list[BashSession] = []
+        self._session_released = asyncio.Condition()
 
     async def __aenter__(self) -> "SandboxExecutor":
         if self.reconnect_sandbox_id:
             self.sbx = await AsyncSandbox.resume(api_key=config.e2b_api_key, sandbox_id=self.reconnect_sandbox_id, timeout=3_600)
-            processes = await self.sbx.commands.list()
-            last_command_process = next((p for p in processes if p.cmd == "/bin/bash" and p.args and p.args[-1] == "/bin/bash"), None)
-            if not last_command_process:
-                print("NO COMMAND FOUND IN RECONNECT, RESTARTING")
-                await self.restart_bash()
-            else:
-                self.command = await self.sbx.commands.connect(
-                    last_command_process.pid,
-                    on_stdout=self._on_stdout,
-                    on_stderr=self._on_stderr,
-                )
-            await task_service.update_sandbox_usage(self.session, self.task_id, "running")
+            idle_shells = await self._idle_shells()
+            if not idle_shells:
+                print("NO IDLE SHELL FOUND IN RECONNECT, STARTING FRESH ONES")
+            for pid in idle_shells[:self.pool_size]:
+                bash_session = BashSession(self.sbx, self.task_id, self._generation)
+                await bash_session.attach(pid)
+                self._sessions.append(bash_session)
+                self._idle.append(bash_session)
+            heartbeat_tracker.record(self.task_id)
             return self
-        
+
         self.sbx = await AsyncSandbox.create(api_key=config.e2b_api_key, timeout=3_600)
         await task_service.update_sandbox_id(self.session, self.task_id, self.sbx.sandbox_id)
-        await self.restart_bash()
-        await task_service.update_sandbox_usage(self.session, self.task_id, "running")
+        heartbeat_tracker.record(self.task_id)
         return self
 
     async def __aexit__(self, *args: Any) -> None:
         pass
 
-    def _on_stdout(self, output: str) -> None:
-        if self.current_marker:
-            self.output_buffer.append(output)
-            if self.current_marker in output:
-                self.command_complete_event.set()
-    
-    def _on_stderr(self, output: str) -> None:
-        if self.current_marker:
-            self.output_buffer.append(output)
+    async def _idle_shells(self) -> list[int]:
+        """Pids of the sandbox's session shells that have no child process, so aren't still running a
+        command (such as one retired after a timeout)"""
+        processes = await self.sbx.commands.list()
+        shells = [p.pid for p in processes if p.cmd == "/bin/bash" and p.args and p.args[-1] == "/bin/bash"]
+        if not shells:
+            return []
+        result = await self.sbx.commands.run(
+            f"for pid in {' '.join(map(str, shells))}; do pgrep -P $pid > /dev/null; [ $? -eq 1 ] && echo $pid; done; true",
+            timeout=10,
+        )
+        return [int(pid) for pid in result.stdout.split()]
 
-    async def run(self, command: str, raise_on_error: bool = False) -> str:
-        if not self.sbx or not self.command:
-            raise RuntimeError("SandboxExecutor must be used as an async context manager")
-        await task_service.update_sandbox_usage(self.session, self.task_id, "running")
-        
+    @asynccontextmanager
+    async def bash_session(self) -> AsyncGenerator[BashSession, None]:
+        """Check out a session for one command, waiting if all of them are busy"""
+        bash_session = await self._checkout()
+        try:
+            yield bash_session
+        finally:
+            await self._checkin(bash_session)
+
+    async def _checkout(self) -> BashSession:
+        async with self._session_released:
+            while not self._idle and len(self._sessions) >= self.pool_size:
+                await self._session_released.wait()
+            if self._idle:
+                bash_session = self._idle.pop()
+            else:
+                bash_session = BashSession(self.sbx, self.task_id, self._generation)
+                self._sessions.append(bash_session)
         try:
-            self.current_marker = f"COMMAND_COMPLETE_{nanoid.generate()}"
-            self.output_buffer = []
-            self.command_complete_event.clear()
-            if self.command.exit_code is not None:
-                print("COMMAND EXITED, RESTARTING")
-                await self.restart_bash()
-
-            command_with_marker = f"{command}; echo '{self.current_marker}'\n"
-            try:
-                await self.sbx.commands.send_stdin(self.command.pid, command_with_marker, request_timeout=5)
-            except NotFoundException:
-                print("COMMAND NOT FOUND, RESTARTING")
-                await self.restart_bash()
-                await self.sbx.commands.send_stdin(self.command.pid, command_with_marker, request_timeout=5)
-            try:
-                await asyncio.wait_for(self.command_complete_event.wait(), timeout=10)
-            except asyncio.TimeoutError:
-                output = "Error: Command timed out after 10 seconds"
+            if not bash_session.alive:
+                await bash_session.start()
+        except BaseException:
+            async with self._session_released:
+                self._sessions.remove(bash_session)
+                self._session_released.notify()
+            raise
+        return bash_session
+
+    async def _checkin(self, bash_session: BashSession) -> None:
+        async with self._session_released:
+            dropped = bash_session.timed_out or bash_session.generation != self._generation
+            if dropped:
+                self._sessions.remove(bash_session)
             else:
-                raw_output = "".join(self.output_buffer)
-                output = raw_output.replace(self.current_marker, "").strip()
-            
+                self._idle.append(bash_session)
+            self._session_released.notify()
+        if bash_session.timed_out:
+            await bash_session.retire()
+        elif dropped:
+            await bash_session.kill()
+
+    async def run(
+        self,
+        command: str,
+        raise_on_error: bool = False,
+        on_output: Callable[[str], None] | None = None,
+        max_timeout_seconds: float = config.bash_max_timeout_seconds,
+    ) -> str:
+        if not self.sbx:
+            raise RuntimeError("SandboxExecutor must be used as an async context manager")
+        heartbeat_tracker.record(self.task_id)
+
+        try:
+            async with self.bash_session() as bash_session:
+                output = await bash_session.run(command, max_timeout_seconds=max_timeout_seconds, on_output=on_output)
+                exit_code = bash_session.exit_code
+            if exit_code:
+                if raise_on_error:
+                    raise CommandExitException(stderr="", stdout=output, exit_code=exit_code, error=None)
+                output = f"{output}\n[exit code {exit_code}]".lstrip()
+
             # Format terminal output for display
             terminal_text = f"\n```bash\n$ {command}\n{output}\n```\n"
             return terminal_text
-            
+
         except CommandExitException as e:
             if raise_on_error:
                 raise e
@@ -99,16 +369,76 @@ class SandboxExecutor:
             raise e
 
     async def restart_bash(self) -> None:
+        """Replace every session with a fresh shell; idle shells are killed now, busy ones when they finish"""
         if not self.sbx:
             raise RuntimeError("SandboxExecutor must be used as an async context manager")
-            
+        async with self._session_released:
+            self._generation += 1
+            dropped, self._idle = self._idle, []
+            for bash_session in dropped:
+                self._sessions.remove(bash_session)
+            self._session_released.notify_all()
+        await asyncio.gather(*(bash_session.kill() for bash_session in dropped))
+
+    async def start_job(self, command: str) -> str:
+        """Run command detached from every shell, in REPO_PATH, spooling its output to a file in the sandbox.
+
+        The job's state lives only in the sandbox (JOBS_PATH/<job_id>), so later runs and reconnects can
+        still check on it.
+        """
+        if not self.sbx:
+            raise RuntimeError("SandboxExecutor must be used as an async context manager")
+        heartbeat_tracker.record(self.task_id)
+        job_id: str = nanoid.generate(JOB_ID_ALPHABET, 8)
+        job_path = f"{JOBS_PATH}/{job_id}"
+        job_script = (
+            f"cd {REPO_PATH} 2>/dev/null; bash -c {shlex.quote(command)} > {job_path}/output 2>&1 < /dev/null; "
+            f"echo $? > {job_path}/exit_code.tmp && mv {job_path}/exit_code.tmp {job_path}/exit_code"
+        )
+        await self.sbx.commands.run(
+            f"mkdir -p {job_path} && printf '%s' {shlex.quote(command)} > {job_path}/command && "
+            f"touch {job_path}/output && (setsid bash -c {shlex.quote(job_script)} > /dev/null 2>&1 < /dev/null &)",
+            timeout=10,
+        )
+        return job_id
+
+    async def job_status(self, job_id: str) -> JobStatus:
+        if not re.fullmatch(f"[{JOB_ID_ALPHABET}]+", job_id):
+            raise ValueError(f"Unknown job: {job_id}")
+        heartbeat_tracker.record(self.task_id)
+        job_path = f"{JOBS_PATH}/{job_id}"
+        try:
+            result = await self.sbx.commands.run(
+                f"test -d {job_path} || exit 3; "
+                f"printf '%s\\n%s\\n' \"$(cat {job_path}/exit_code 2>/dev/null)\" \"$(stat -c %s {job_path}/output)\"",
+                timeout=10,
+            )
+        except CommandExitException:
+            raise ValueError(f"Unknown job: {job_id}")
+        exit_code, output_bytes = result.stdout.split("\n")[:2]
+        return JobStatus(job_id, int(exit_code) if exit_code else None, int(output_bytes))
+
+    async def wait_for_job(self, job_id: str, timeout_seconds: float) -> JobStatus:
+        """Poll until the job exits or timeout_seconds pass, checking often at first and backing off
+        for jobs that take a while"""
+        deadline = time.monotonic() + timeout_seconds
+        interval = 0.25
+        while True:
+            status = await self.job_status(job_id)
+            remaining = deadline - time.monotonic()
+            if status.exit_code is not None or remaining <= 0:
+                return status
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 2, 5)
+
+    async def read_job_output(self, job_id: str, offset: int, max_bytes: int) -> JobOutput:
+        """Up to max_bytes of the job's output starting at byte offset; a negative offset counts from the end"""
+        status = await self.job_status(job_id)
+        if offset < 0:
+            offset = max(status.output_bytes + offset, 0)
         result = await self.sbx.commands.run(
-            "/bin/bash", 
-            background=True, 
-            on_stdout=self._on_stdout, 
-            on_stderr=self._on_stderr,
-            # cwd=REPO_PATH # errors for some reason
+            f"tail -c +{offset + 1} {JOBS_PATH}/{job_id}/output | head -c {max_bytes} | base64 -w0",
+            timeout=10,
         )
-        self.command = result
-        self.output_buffer = []
-        self.command_complete_event.clear()
\ No newline at end of file
+        data = base64.b64decode(result.stdout)
+        return JobOutput(status, offset, offset + len(data), data.decode("utf-8", "replace"))
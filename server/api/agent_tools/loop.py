@@ -1,39 +1,70 @@
 from typing import Sequence
 from anthropic import AsyncAnthropic
-from anthropic.types import MessageParam, ToolResultBlockParam
+from anthropic.types import Message, MessageParam, ToolResultBlockParam
 import api.task.queue_service as queue_service
 import api.task.service as task_service
-from api.llm.settings import config as llm_config
+from api.llm.client import get_client
+from api.llm.scheduler import llm_scheduler, Tenant
 from api.database.dependencies import async_session
 from .tools import AgentToolbox
 from .models import ToolInputBlock, ToolResultBlock
+from .dispatch import ToolDispatcher
+from .prompt_cache import cached_system_prompt, with_cache_breakpoint, format_usage
+from .context import compact_messages
 from api.task.models import TextBlock, ContentBlock as ContentBlockModel
-from api.task.settings import REPO_PATH
+from api.task.settings import REPO_PATH, config as task_config
 
 
 async def run_agent_loop(
     task_id: int,
+    tenant: Tenant,
     toolbox: AgentToolbox, 
     messages: list[MessageParam],
     user_rules_file_content: str,
     max_iterations: int = 20
 ) -> None:
-    client = AsyncAnthropic(api_key=llm_config.anthropic_api_key)
+    client = _client_without_retries()
     current_messages = messages.copy()
     message_order = len(messages)
+    system_prompt = cached_system_prompt(get_system_prompt(user_rules_file_content))
 
     for iteration in range(max_iterations):
-        async with client.messages.stream(
-            model="claude-4-sonnet-20250514",
-            max_tokens=10_000,
-            system=get_system_prompt(user_rules_file_content),
-            messages=current_messages,
-            tools=toolbox.to_params(),
-        ) as stream:
-            async for chunk in stream:
-                await queue_service.push_message_stream_event(task_id, chunk)
+        current_messages, elided = compact_messages(
+            current_messages,
+            task_config.context_budget_tokens,
+            task_config.context_target_tokens,
+            task_config.context_keep_recent_messages,
+        )
+        if elided:
+            print(f"Task {task_id}: elided {elided} old tool results to fit the context budget")
 
-        final_message = await stream.get_final_message()
+        dispatcher = ToolDispatcher(toolbox)
+        streamed = False
+
+        async def stream_response() -> Message:
+            nonlocal streamed
+            async with client.messages.stream(
+                model="claude-4-sonnet-20250514",
+                max_tokens=10_000,
+                system=system_prompt,
+                messages=with_cache_breakpoint(current_messages),
+                tools=toolbox.to_params(),
+            ) as stream:
+                async for chunk in stream:
+                    streamed = True
+                    await queue_service.push_message_stream_event(task_id, chunk)
+                    if chunk.type == "content_block_stop" and chunk.content_block.type == "tool_use":
+                        tool_input_block = ToolInputBlock.from_tool_call(chunk.content_block)
+                        await queue_service.push(task_id, tool_input_block)
+                        dispatcher.dispatch(tool_input_block)
+            return await stream.get_final_message()
+
+        try:
+            final_message = await llm_scheduler.run(tenant, stream_response, can_retry=lambda: not streamed)
+        except BaseException:
+            dispatcher.cancel()
+            raise
+        print(f"Task {task_id} iteration {iteration}: {format_usage(final_message.usage)}")
         current_messages.append({
             "role": final_message.role,
             "content": final_message.content
@@ -47,51 +78,39 @@ async def run_agent_loop(
             elif content_block.type == "tool_use":
                 tool_input_block = ToolInputBlock.from_tool_call(content_block)
                 content_blocks.append(tool_input_block)
-                await queue_service.push(task_id, tool_input_block)
-        
-        # Save assistant message to database
-        if content_blocks:
-            async with async_session() as session:
-                message = await task_service.create_message(
-                    session, task_id, "assistant", message_order
-                )
-                await task_service.save_content_blocks(session, message.id, content_blocks)
+                if not dispatcher.is_dispatched(tool_input_block.tool_id):
+                    await queue_service.push(task_id, tool_input_block)
+                    dispatcher.dispatch(tool_input_block)
         
-        message_order += 1
         tool_calls = [block for block in content_blocks if block.type == "tool_input"]
         if not tool_calls:
+            async with async_session() as session:
+                await task_service.save_iteration(session, task_id, message_order, content_blocks, [])
+            await queue_service.mark_persisted(task_id)
             break
         
         tool_results: list[ToolResultBlockParam] = []
         tool_result_blocks: list[ToolResultBlock] = []
         
-        for tool_call in tool_calls:
-            try:
-                tool_result = await toolbox.execute_tool(tool_call)
-            except Exception as e:
-                print("ERROR EXECUTING TOOL: ", e)
-                tool_result = ToolResultBlockParam(
-                    type="tool_result",
-                    tool_use_id=tool_call.tool_id,
-                    content=f"Error: {str(e)}",
-                    is_error=True,
-                )
-            finally:
-                tool_results.append(tool_result)
-                tool_result_blocks.append(ToolResultBlock.from_tool_result(tool_result))
-                await queue_service.push(task_id, ToolResultBlock.from_tool_result(tool_result))
+        async for _, tool_result in dispatcher.results():
+            tool_results.append(tool_result)
+            tool_result_blocks.append(ToolResultBlock.from_tool_result(tool_result))
+            await queue_service.push(task_id, ToolResultBlock.from_tool_result(tool_result))
         
-        if tool_result_blocks:
-            async with async_session() as session:
-                message = await task_service.create_message(
-                    session, task_id, "user", message_order
-                )
-                await task_service.save_content_blocks(session, message.id, tool_result_blocks)
+        # Save the assistant message and its tool results together
+        async with async_session() as session:
+            await task_service.save_iteration(session, task_id, message_order, content_blocks, tool_result_blocks)
+        await queue_service.mark_persisted(task_id)
         
-        message_order += 1
+        message_order += 2
         current_messages.append({ "role": "user", "content": tool_results })
 
 
+def _client_without_retries() -> AsyncAnthropic:
+    """The scheduler owns retries, so a rate-limited call gives its slot back while it waits"""
+    return get_client().with_options(max_retries=0)
+
+
 def get_system_prompt(user_rules_file_content: str) -> str:
     return f"""
 You are a helpful programmer. Your job is to help the user with their task by using the tools provided to you.
@@ -102,8 +121,10 @@ The user cannot see tool results by default, so make sure to include any necessa
 
 <tools>
 Always try to make multiple tool calls at once to avoid round trips to the sandbox server.
-All commands timeout after 10 seconds.
-For the bash tool always pass in an extra parameter "description" which is a short 2-4 word summary of what the command does that is shown to the user.
+Bash calls made at once may run concurrently in separate shell sessions, so don't rely on one of them seeing a cd or export from another.
+Bash commands may run for up to {task_config.bash_max_timeout_seconds:g} seconds while they keep printing output, and give up after {task_config.bash_idle_timeout_seconds:g} seconds without output.
+For anything that may take longer, such as builds, full test suites or servers, use the job tool: start the job, then check its status (waiting if you have nothing else to do) and read its output.
+For the bash tool and job starts always pass in an extra parameter "description" which is a short 2-4 word summary of what the command does that is shown to the user.
 </tools>
 
 <user_rules>
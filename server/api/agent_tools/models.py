@@ -42,6 +42,31 @@ class BashToolInput(BaseModel):
     description: str | None = None
 
 
+class StartJobCommand(BaseModel):
+    operation: Literal["start"]
+    command: str | None = None
+    description: str | None = None
+
+
+class JobStatusCommand(BaseModel):
+    operation: Literal["status"]
+    job_id: str | None = None
+    wait_seconds: float = 0
+
+
+class JobOutputCommand(BaseModel):
+    operation: Literal["output"]
+    job_id: str | None = None
+    offset: int = 0
+    max_bytes: int | None = None
+
+
+JobInput = Annotated[
+    Union[StartJobCommand, JobStatusCommand, JobOutputCommand],
+    Field(discriminator="operation")
+]
+
+
 class ToolInputSetup(BaseModel):
     type: Literal["tool_input"] = "tool_input"
     tool_id: str
@@ -63,9 +88,16 @@ class ToolInputTextEditor(BaseModel):
     tool_input: TextEditorInput
 
 
+class ToolInputJob(BaseModel):
+    type: Literal["tool_input"] = "tool_input"
+    tool_id: str
+    tool_name: Literal["job"] = "job"
+    tool_input: JobInput
+
+
 class ToolInputBlock(RootModel[
     Annotated[
-        Union[ToolInputBash, ToolInputTextEditor, ToolInputSetup], 
+        Union[ToolInputBash, ToolInputTextEditor, ToolInputJob, ToolInputSetup], 
         Field(discriminator="tool_name")
     ]
 ]):
@@ -79,7 +111,7 @@ class ToolInputBlock(RootModel[
     def tool_name(self) -> str:
         return self.root.tool_name
     @property
-    def tool_input(self) -> TextEditorInput | BashToolInput | str:
+    def tool_input(self) -> TextEditorInput | BashToolInput | JobInput | str:
         return self.root.tool_input
     
     @classmethod
@@ -0,0 +1,81 @@
+import asyncio
+from typing import Any
+import api.task.queue_service as queue_service
+from api.task.models import ToolOutputDeltaEvent
+from api.task.settings import config
+
+
+class ToolOutputStream:
+    """Forwards a running command's output to SSE subscribers as tool_output_delta events.
+
+    The sandbox calls write for every chunk; chunks are buffered and flushed at most once per
+    interval, so a chatty command costs a bounded number of events. Past max_chars the rest is
+    dropped and the last event is marked truncated. The tool result still carries the full output.
+    """
+
+    def __init__(
+        self,
+        task_id: int,
+        tool_id: str,
+        interval_seconds: float = config.tool_output_delta_interval_ms / 1000,
+        max_chars: int = config.tool_output_delta_max_chars,
+    ):
+        self.task_id = task_id
+        self.tool_id = tool_id
+        self.interval_seconds = interval_seconds
+        self.max_chars = max_chars
+        self._pending: list[str] = []
+        self._chars = 0
+        self._truncated = False
+        self._truncation_sent = False
+        self._written = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._pump_task: asyncio.Task[None] | None = None
+
+    async def __aenter__(self) -> "ToolOutputStream":
+        self._pump_task = asyncio.create_task(self._pump())
+        return self
+
+    async def __aexit__(self, exc_type: Any, *args: Any) -> None:
+        assert self._pump_task is not None
+        if exc_type is not None:
+            self._pump_task.cancel()
+            return
+        self._closed.set()
+        self._written.set()
+        await self._pump_task
+
+    def write(self, chunk: str) -> None:
+        if self._truncated or not chunk:
+            return
+        room = self.max_chars - self._chars
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            self._truncated = True
+        self._chars += len(chunk)
+        self._pending.append(chunk)
+        self._written.set()
+
+    async def _pump(self) -> None:
+        while True:
+            await self._written.wait()
+            self._written.clear()
+            await self._flush()
+            if self._closed.is_set() and not self._pending:
+                return
+            await self._wait_interval()
+
+    async def _wait_interval(self) -> None:
+        """Rate limit flushes; closing cuts the wait short so the final flush isn't delayed"""
+        try:
+            await asyncio.wait_for(self._closed.wait(), self.interval_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _flush(self) -> None:
+        if not self._pending and (not self._truncated or self._truncation_sent):
+            return
+        output, self._pending = "".join(self._pending), []
+        truncated = self._truncated
+        self._truncation_sent = truncated
+        await queue_service.push(self.task_id, ToolOutputDeltaEvent(tool_id=self.tool_id, output=output, truncated=truncated))
@@ -0,0 +1,37 @@
+from typing import Any
+from anthropic.types import CacheControlEphemeralParam, MessageParam, TextBlockParam, Usage
+
+CACHE_CONTROL: CacheControlEphemeralParam = {"type": "ephemeral"}
+
+
+def cached_system_prompt(system_prompt: str) -> list[TextBlockParam]:
+    return [TextBlockParam(type="text", text=system_prompt, cache_control=CACHE_CONTROL)]
+
+
+def with_cache_breakpoint(messages: list[MessageParam]) -> list[MessageParam]:
+    """A copy of messages whose last content block carries a cache breakpoint; messages is not modified.
+
+    With the breakpoints on the system prompt and the last tool definition, each iteration of the
+    agent loop only pays full price for what was appended since the previous one. SDK response
+    objects (an assistant turn) can't carry cache_control, so such a turn is left unmarked.
+    """
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last["content"]
+    blocks: list[Any]
+    if isinstance(content, str):
+        blocks = [TextBlockParam(type="text", text=content)]
+    else:
+        blocks = list(content)
+    if not blocks or not isinstance(blocks[-1], dict):
+        return messages
+    blocks[-1] = {**blocks[-1], "cache_control": CACHE_CONTROL}
+    return [*messages[:-1], {"role": last["role"], "content": blocks}]
+
+
+def format_usage(usage: Usage) -> str:
+    return (
+        f"input={usage.input_tokens} cache_read={usage.cache_read_input_tokens or 0} "
+        f"cache_write={usage.cache_creation_input_tokens or 0} output={usage.output_tokens}"
+    )
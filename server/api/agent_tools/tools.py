@@ -2,10 +2,37 @@ from .executor import SandboxExecutor
 from anthropic.types import (
     ToolUnionParam, 
     ToolBash20250124Param, 
+    ToolParam,
     ToolResultBlockParam,
 )
 from anthropic.types.beta import BetaToolTextEditor20250429Param
-from .models import ToolInputBlock, TextEditorInput, BashToolInput
+from .models import ToolInputBlock, TextEditorInput, BashToolInput, JobInput
+from api.task.settings import config
+from .prompt_cache import CACHE_CONTROL
+from .output_stream import ToolOutputStream
+
+JOB_TOOL = ToolParam(
+    name="job",
+    description=(
+        "Run long commands (builds, test suites, installs, dev servers) in the background. "
+        "'start' runs command detached in the repository directory with its output spooled to a file and returns a job id. "
+        "'status' reports whether the job is still running and its exit code, waiting up to wait_seconds for it to finish. "
+        "'output' reads the job's output from byte offset (negative counts from the end) and says which offset to read next."
+    ),
+    input_schema={
+        "type": "object",
+        "properties": {
+            "operation": {"type": "string", "enum": ["start", "status", "output"]},
+            "command": {"type": "string", "description": "Shell command to run, for start"},
+            "description": {"type": "string", "description": "Short 2-4 word summary of the command shown to the user, for start"},
+            "job_id": {"type": "string", "description": "Job id returned by start, for status and output"},
+            "wait_seconds": {"type": "number", "description": f"For status, wait up to this long (at most {config.job_max_wait_seconds:g}) for the job to finish"},
+            "offset": {"type": "integer", "description": "For output, byte offset to read from; negative counts from the end"},
+            "max_bytes": {"type": "integer", "description": f"For output, bytes to read (at most {config.job_output_max_bytes})"},
+        },
+        "required": ["operation"],
+    },
+)
 
 
 
@@ -16,7 +43,8 @@ class AgentToolbox:
     def to_params(self) -> list[ToolUnionParam]:
         return [
             ToolBash20250124Param(name="bash", type="bash_20250124"),
-            BetaToolTextEditor20250429Param(name="str_replace_based_edit_tool", type="text_editor_20250429") # type: ignore
+            JOB_TOOL,
+            BetaToolTextEditor20250429Param(name="str_replace_based_edit_tool", type="text_editor_20250429", cache_control=CACHE_CONTROL) # type: ignore
         ]
 
     async def execute_tool(self, tool_call: ToolInputBlock) -> ToolResultBlockParam:
@@ -28,12 +56,20 @@ class AgentToolbox:
                     tool_use_id=tool_call.root.tool_id,
                     content="Bash restarted"
                 )
-            output = await self.executor.run(tool_call.root.tool_input.command or "")
+            async with ToolOutputStream(self.executor.task_id, tool_call.root.tool_id) as output_stream:
+                output = await self.executor.run(tool_call.root.tool_input.command or "", on_output=output_stream.write)
             return ToolResultBlockParam(
                 type="tool_result",
                 tool_use_id=tool_call.root.tool_id,
                 content=output
             )
+        elif tool_call.root.tool_name == "job":
+            result = await self._handle_job_tool(tool_call.root.tool_input)
+            return ToolResultBlockParam(
+                type="tool_result",
+                tool_use_id=tool_call.root.tool_id,
+                content=result
+            )
         elif tool_call.root.tool_name == "str_replace_based_edit_tool":
             result = await self._handle_text_editor_tool(tool_call.root.tool_input)
             return ToolResultBlockParam(
@@ -43,6 +79,31 @@ class AgentToolbox:
             )
         raise ValueError(f"Unknown tool: {tool_call.root.tool_name}")
     
+    async def _handle_job_tool(self, tool_input: JobInput) -> str:
+        if tool_input.operation == "start":
+            if not tool_input.command:
+                raise ValueError("start needs a command")
+            job_id = await self.executor.start_job(tool_input.command)
+            return f"Started job {job_id}"
+
+        if not tool_input.job_id:
+            raise ValueError(f"{tool_input.operation} needs a job_id")
+
+        if tool_input.operation == "status":
+            wait_seconds = min(max(tool_input.wait_seconds, 0), config.job_max_wait_seconds)
+            status = await self.executor.wait_for_job(tool_input.job_id, wait_seconds)
+            if status.exit_code is None:
+                return f"Job {status.job_id} is still running, {status.output_bytes} bytes of output so far"
+            return f"Job {status.job_id} exited with code {status.exit_code}, {status.output_bytes} bytes of output"
+
+        max_bytes = min(tool_input.max_bytes or config.job_output_max_bytes, config.job_output_max_bytes)
+        output = await self.executor.read_job_output(tool_input.job_id, tool_input.offset, max(max_bytes, 1))
+        state = "still running" if output.status.exit_code is None else f"exited with code {output.status.exit_code}"
+        result = f"Job {output.status.job_id} {state}. Output bytes {output.offset}-{output.next_offset} of {output.status.output_bytes}:\n{output.text}"
+        if output.next_offset < output.status.output_bytes:
+            result += f"\n[Read on with offset={output.next_offset}]"
+        return result
+
     async def _handle_text_editor_tool(self, tool_input: TextEditorInput) -> str:
         if tool_input.command not in ["view", "str_replace", "create", "insert"]:
             raise ValueError(f"Unknown command: {tool_input.command}")
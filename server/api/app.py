@@ -8,6 +8,10 @@ from api.project.views import router as project_router
 from api.task.views import router as task_router
 from api.auth.views import router as auth_router
 from api.task.cleanup_service import start_cleanup_service, stop_cleanup_service
+import api.task.queue_service as queue_service
+from api.task.heartbeat_service import start_heartbeat_tracker, stop_heartbeat_tracker
+from api.auth.jwks_service import start_jwks_refresher, stop_jwks_refresher
+from api.llm.client import start_anthropic_client, stop_anthropic_client
 
 router = APIRouter(dependencies=[Depends(get_authenticated_user_id)])
 router.include_router(project_router)
@@ -17,9 +21,17 @@ router.include_router(auth_router)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    await start_jwks_refresher()
+    await start_anthropic_client()
+    await queue_service.start()
+    await start_heartbeat_tracker()
     await start_cleanup_service()
     yield
     await stop_cleanup_service()
+    await stop_heartbeat_tracker()
+    await queue_service.stop()
+    await stop_anthropic_client()
+    await stop_jwks_refresher()
 
 
 def get_app() -> FastAPI:
@@ -35,6 +47,7 @@ def get_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
     app.include_router(router)
     
@@ -1,23 +1,42 @@
-from typing import Annotated, Any
+from typing import Annotated, NamedTuple
 from fastapi import Request, HTTPException, status, Depends
 import json
-import requests
-from jose import jwt, jwk
-from cachetools import TTLCache, cached
+import time
+import hashlib
+from jose import jwt
+from cachetools import TLRUCache
 from .settings import config
+from .jwks_service import jwks_refresher
 
-JWKS_URL = f"https://api.stack-auth.com/api/v1/projects/{config.stack_project_id}/.well-known/jwks.json"
 
+class VerifiedToken(NamedTuple):
+    user_id: str
+    expires_at: float
 
-@cached(cache=TTLCache(maxsize=1, ttl=3600))
-def fetch_jwks() -> list[dict[str, Any]]:
-    response = requests.get(JWKS_URL)
-    response.raise_for_status()
-    jwks_data: list[dict[str, Any]] = response.json()
-    return jwks_data
 
+_verified_tokens: TLRUCache[bytes, VerifiedToken] = TLRUCache(
+    maxsize=config.verified_token_cache_size,
+    ttu=lambda _, token, now: token.expires_at,
+    timer=time.time,
+)
 
-def get_authenticated_user_id(request: Request) -> str:
+
+async def verify_access_token(access_token: str) -> str:
+    token_hash = hashlib.sha256(access_token.encode()).digest()
+    verified = _verified_tokens.get(token_hash)
+    if verified is not None:
+        return verified.user_id
+
+    unverified_header = jwt.get_unverified_header(access_token)
+    key, algorithm = await jwks_refresher.get_key(unverified_header["kid"])
+    payload = jwt.decode(access_token, key, algorithms=[algorithm], audience=config.stack_project_id)
+    user_id: str = payload["sub"]
+    if "exp" in payload:
+        _verified_tokens[token_hash] = VerifiedToken(user_id, float(payload["exp"]))
+    return user_id
+
+
+async def get_authenticated_user_id(request: Request) -> str:
     auth_header = request.headers.get("x-stack-auth")
     if not auth_header:
         raise HTTPException(
@@ -26,12 +45,7 @@ def get_authenticated_user_id(request: Request) -> str:
         )
     try:
         access_token = json.loads(auth_header)["accessToken"]
-        jwks = fetch_jwks() 
-        unverified_header = jwt.get_unverified_header(access_token)
-        key_data = next(k for k in jwks["keys"] if k["kid"] == unverified_header["kid"]) # type: ignore
-        key = jwk.construct(key_data)
-        payload = jwt.decode(access_token, key, algorithms=[key_data["alg"]], audience=config.stack_project_id)
-        return payload["sub"] # type: ignore
+        return await verify_access_token(access_token)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -39,4 +53,3 @@ def get_authenticated_user_id(request: Request) -> str:
         )
 
 AuthenticatedUserId = Annotated[str, Depends(get_authenticated_user_id)]
-
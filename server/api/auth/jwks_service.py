@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Any
+import requests
+from jose import jwk
+from .settings import config
+
+JWKS_URL = f"https://api.stack-auth.com/api/v1/projects/{config.stack_project_id}/.well-known/jwks.json"
+
+SigningKey = tuple[Any, str]
+
+
+class JwksRefresher:
+    """Keeps the identity provider's signing keys in memory, refreshed in the background.
+
+    Requests never wait on the periodic refresh: the current key set keeps being served until
+    a new one has been fetched and constructed. Only a kid we have never seen triggers an
+    immediate fetch, shared by every request waiting on it and rate limited so random kids
+    cannot hammer the provider.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        refresh_interval_seconds: float = 3000,
+        retry_interval_seconds: float = 30,
+        unknown_kid_cooldown_seconds: float = 30,
+        timeout_seconds: float = 10,
+    ):
+        self.url = url
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.retry_interval_seconds = retry_interval_seconds
+        self.unknown_kid_cooldown_seconds = unknown_kid_cooldown_seconds
+        self.timeout_seconds = timeout_seconds
+        self.running = False
+        self.task: asyncio.Task[None] | None = None
+        self.fetched_at: float | None = None
+        self._keys: dict[str, SigningKey] = {}
+        self._inflight: asyncio.Task[None] | None = None
+        self._last_unknown_kid_fetch = 0.0
+
+    async def start(self) -> None:
+        """Fetch the keys once, then keep refreshing them in the background"""
+        if self.running:
+            return
+
+        self.running = True
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"Error fetching JWKS, will retry: {e}")
+        self.task = asyncio.create_task(self._refresh_loop())
+        print(f"Started JWKS refresher (refresh_interval={self.refresh_interval_seconds}s)")
+
+    async def stop(self) -> None:
+        """Stop the background refresh loop"""
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        print("Stopped JWKS refresher")
+
+    def load(self, jwks: dict[str, Any]) -> None:
+        """Construct every key up front and swap the whole set in at once"""
+        self._keys = {key_data["kid"]: (jwk.construct(key_data), key_data["alg"]) for key_data in jwks["keys"]}
+        self.fetched_at = time.monotonic()
+
+    async def refresh(self) -> None:
+        """Fetch the key set; concurrent callers share a single request"""
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._fetch())
+            self._inflight.add_done_callback(self._clear_inflight)
+        await asyncio.shield(self._inflight)
+
+    async def get_key(self, kid: str) -> SigningKey:
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        if self._inflight is not None or time.monotonic() - self._last_unknown_kid_fetch >= self.unknown_kid_cooldown_seconds:
+            self._last_unknown_kid_fetch = time.monotonic()
+            await self.refresh()
+        return self._keys[kid]
+
+    async def _fetch(self) -> None:
+        response = await asyncio.to_thread(requests.get, self.url, timeout=self.timeout_seconds)
+        response.raise_for_status()
+        self.load(response.json())
+
+    def _clear_inflight(self, task: asyncio.Task[None]) -> None:
+        self._inflight = None
+        if not task.cancelled():
+            task.exception()
+
+    async def _refresh_loop(self) -> None:
+        interval = self.refresh_interval_seconds if self.fetched_at is not None else self.retry_interval_seconds
+        while self.running:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+                interval = self.refresh_interval_seconds
+            except Exception as e:
+                print(f"Error refreshing JWKS: {e}")
+                interval = self.retry_interval_seconds
+
+
+# Global instance
+jwks_refresher = JwksRefresher(
+    JWKS_URL,
+    refresh_interval_seconds=config.jwks_refresh_interval_seconds,
+    unknown_kid_cooldown_seconds=config.jwks_unknown_kid_cooldown_seconds,
+)
+
+
+async def start_jwks_refresher() -> None:
+    """Start the global JWKS refresher"""
+    await jwks_refresher.start()
+
+
+async def stop_jwks_refresher() -> None:
+    """Stop the global JWKS refresher"""
+    await jwks_refresher.stop()
@@ -4,5 +4,8 @@ from api.settings import GlobalConfig
 class Config(GlobalConfig):
     stack_project_id: str
     openai_api_key: str
+    verified_token_cache_size: int = 10_000
+    jwks_refresh_interval_seconds: float = 3000
+    jwks_unknown_kid_cooldown_seconds: float = 30
 
 config = Config()
\ No newline at end of file
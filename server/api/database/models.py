@@ -1,6 +1,7 @@
 import uuid
 from datetime import datetime
 from typing import Any, Literal
+from sqlalchemy import Index, text
 from sqlmodel import SQLModel, Field, JSON, Column, String
 from .utils import utc_now
 
@@ -19,6 +20,15 @@ class Project(SQLModel, table=True):
 
 
 class Task(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_task_project_id_created_at", "project_id", text("created_at DESC")),
+        Index(
+            "ix_task_running_sandbox_last_used_at",
+            "last_used_at",
+            postgresql_where=text("sandbox_state = 'running' AND sandbox_id IS NOT NULL"),
+        ),
+    )
+
     id: int = Field(primary_key=True, default=None)
     external_id: str = Field(unique=True, index=True, default_factory=lambda: str(uuid.uuid4()))
     project_id: int = Field(foreign_key="project.id")
@@ -32,6 +42,8 @@ class Task(SQLModel, table=True):
 
 
 class Message(SQLModel, table=True):
+    __table_args__ = (Index("ix_message_task_id_id", "task_id", "id"),)
+
     id: int = Field(primary_key=True, default=None)
     external_id: str = Field(unique=True, index=True, default_factory=lambda: str(uuid.uuid4()))
     task_id: int = Field(foreign_key="task.id")
@@ -41,6 +53,8 @@ class Message(SQLModel, table=True):
 
 
 class ContentBlock(SQLModel, table=True):
+    __table_args__ = (Index("ix_contentblock_message_id_sequence_number", "message_id", "sequence_number"),)
+
     id: int = Field(primary_key=True, default=None)
     message_id: int = Field(foreign_key="message.id")
     block_type: str  # 'text', 'tool_input', 'tool_result'
@@ -1,3 +1,4 @@
+import base64
 from typing import TypeVar
 from datetime import datetime, timezone
 from sqlalchemy.orm import selectinload as sqlalchemy_selectinload, InstrumentedAttribute
@@ -18,4 +19,13 @@ def selectinload(column_expression: _T) -> ExecutableOption:
 
 
 def utc_now() -> datetime:
-    return datetime.now(timezone.utc).replace(tzinfo=None)
\ No newline at end of file
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def encode_cursor(*values: object) -> str:
+    """Opaque pagination cursor from the keyset values of the last row on a page"""
+    return base64.urlsafe_b64encode("|".join(str(value) for value in values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list[str]:
+    return base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
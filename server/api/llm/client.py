@@ -0,0 +1,112 @@
+import weakref
+import httpx
+import anthropic
+from pydantic import BaseModel
+from .settings import config
+
+
+class AnthropicPoolStats(BaseModel):
+    max_connections: int | None
+    max_keepalive_connections: int | None
+    requests: int
+    responses: int
+    in_flight: int
+
+
+class AnthropicClientManager:
+    """One AsyncAnthropic and HTTP connection pool shared by every LLM call in the process.
+
+    Agent loops and title generation reuse warm connections instead of paying TCP and TLS
+    setup per call. Created in the app lifespan; anything running outside it (scripts) gets
+    the client lazily on first use.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry_seconds: float = 30,
+        http2: bool = False,
+    ):
+        self.api_key = api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_seconds,
+        )
+        self.http2 = http2
+        self.requests = 0
+        self.responses = 0
+        self._in_flight: weakref.WeakSet[httpx.Request] = weakref.WeakSet()
+        self._http_client: httpx.AsyncClient | None = None
+        self._client: anthropic.AsyncAnthropic | None = None
+
+    @property
+    def client(self) -> anthropic.AsyncAnthropic:
+        if self._client is None:
+            self._http_client = anthropic.DefaultAsyncHttpxClient(
+                limits=self.limits,
+                http2=self.http2,
+                event_hooks={"request": [self._on_request], "response": [self._on_response]},
+            )
+            self._client = anthropic.AsyncAnthropic(api_key=self.api_key, http_client=self._http_client)
+        return self._client
+
+    async def start(self) -> None:
+        """Open the pool now rather than on the first call"""
+        self.client
+        print(f"Started Anthropic client (max_connections={self.limits.max_connections}, http2={self.http2})")
+
+    async def stop(self) -> None:
+        """Close pooled connections; a later call would open a fresh pool"""
+        if self._client is not None:
+            await self._client.close()
+        self._client = None
+        self._http_client = None
+        print(f"Stopped Anthropic client ({self.get_stats()})")
+
+    def get_stats(self) -> AnthropicPoolStats:
+        """Counted by the client's event hooks; in_flight is requests still waiting for response headers.
+
+        A request that fails before a response drops out of in_flight once the SDK lets go of it.
+        """
+        return AnthropicPoolStats(
+            max_connections=self.limits.max_connections,
+            max_keepalive_connections=self.limits.max_keepalive_connections,
+            requests=self.requests,
+            responses=self.responses,
+            in_flight=len(self._in_flight),
+        )
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+        self._in_flight.add(request)
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        self.responses += 1
+        self._in_flight.discard(response.request)
+
+
+# Global instance
+anthropic_clients = AnthropicClientManager(
+    config.anthropic_api_key,
+    max_connections=config.anthropic_max_connections,
+    max_keepalive_connections=config.anthropic_max_keepalive_connections,
+    keepalive_expiry_seconds=config.anthropic_keepalive_expiry_seconds,
+    http2=config.anthropic_http2,
+)
+
+
+def get_client() -> anthropic.AsyncAnthropic:
+    return anthropic_clients.client
+
+
+async def start_anthropic_client() -> None:
+    """Create the shared client"""
+    await anthropic_clients.start()
+
+
+async def stop_anthropic_client() -> None:
+    """Close the shared client's connections"""
+    await anthropic_clients.stop()
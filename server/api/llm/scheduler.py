@@ -0,0 +1,223 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Awaitable, Callable, NamedTuple, TypeVar
+import anthropic
+from pydantic import BaseModel
+from .settings import config
+
+T = TypeVar("T")
+
+RATE_LIMITED_STATUS_CODES = (429, 529)
+TRANSIENT_STATUS_CODES = (408, 409)
+
+
+class Tenant(NamedTuple):
+    user_id: str
+    project_id: int
+
+
+class LlmSchedulerStats(BaseModel):
+    active: int
+    queue_depth: int
+    waiting_users: int
+    admitted: int
+    rate_limited: int
+    transient_errors: int
+    total_wait_seconds: float
+    max_wait_seconds: float
+    paused_for_seconds: float
+
+
+class LlmScheduler:
+    """Admission control in front of Anthropic API calls.
+
+    A call runs only when a concurrency slot and a token from the request-rate bucket are both
+    free. Waiting calls are admitted round robin across users, and within a user round robin
+    across projects, so one user's large fleet cannot starve everyone else. A 429 or 529
+    pauses all admissions for the retry-after the API asked for before the call is retried;
+    connection errors, timeouts, 408, 409 and 5xx back off just that call, with its slot given
+    back while it waits.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        requests_per_minute: float = 50,
+        burst: int = 10,
+        max_retries: int = 5,
+        base_backoff_seconds: float = 1.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.refill_per_second = requests_per_minute / 60
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._active = 0
+        self._waiting: OrderedDict[str, OrderedDict[int, deque[asyncio.Future[None]]]] = OrderedDict()
+        self._queue_depth = 0
+        self._wakeup: asyncio.TimerHandle | None = None
+        self.admitted = 0
+        self.rate_limited = 0
+        self.transient_errors = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def run(self, tenant: Tenant, call: Callable[[], Awaitable[T]], can_retry: Callable[[], bool] = lambda: True) -> T:
+        """Run call once admitted, retrying it after rate limits and transient API errors.
+
+        can_retry is asked before each retry; a streaming call returns False once it has emitted
+        output, so a retry never repeats it.
+        """
+        for attempt in range(self.max_retries + 1):
+            async with self._slot(tenant):
+                try:
+                    return await call()
+                except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+                    if attempt == self.max_retries or not _is_retryable(e) or not can_retry():
+                        raise
+                    error = e
+            delay = _retry_after(error) or self.base_backoff_seconds * 2 ** attempt
+            if isinstance(error, anthropic.APIStatusError) and error.status_code in RATE_LIMITED_STATUS_CODES:
+                self.rate_limited += 1
+                print(f"Anthropic API returned {error.status_code}, pausing admissions for {delay:.1f}s")
+                self._pause(delay)
+            else:
+                self.transient_errors += 1
+                print(f"Anthropic API call failed ({error!r}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def get_stats(self) -> LlmSchedulerStats:
+        return LlmSchedulerStats(
+            active=self._active,
+            queue_depth=self._queue_depth,
+            waiting_users=len(self._waiting),
+            admitted=self.admitted,
+            rate_limited=self.rate_limited,
+            transient_errors=self.transient_errors,
+            total_wait_seconds=self.total_wait_seconds,
+            max_wait_seconds=self.max_wait_seconds,
+            paused_for_seconds=max(self._paused_until - time.monotonic(), 0.0),
+        )
+
+    @asynccontextmanager
+    async def _slot(self, tenant: Tenant) -> AsyncGenerator[None, None]:
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        projects = self._waiting.setdefault(tenant.user_id, OrderedDict())
+        projects.setdefault(tenant.project_id, deque()).append(waiter)
+        self._queue_depth += 1
+        queued_at = time.monotonic()
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                self._remove(tenant, waiter)
+            raise
+
+        waited = time.monotonic() - queued_at
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if waited >= 5:
+            print(f"LLM call for project {tenant.project_id} waited {waited:.1f}s for admission ({self.get_stats()})")
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    def _remove(self, tenant: Tenant, waiter: asyncio.Future[None]) -> None:
+        projects = self._waiting.get(tenant.user_id)
+        waiters = projects.get(tenant.project_id) if projects else None
+        if projects is None or waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        self._queue_depth -= 1
+        if not waiters:
+            del projects[tenant.project_id]
+        if not projects:
+            del self._waiting[tenant.user_id]
+
+    def _pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.refill_per_second)
+        self._refilled_at = now
+
+    def _next_waiter(self) -> asyncio.Future[None]:
+        """The next waiter, taken round-robin over users and then over each user's projects"""
+        user_id, projects = next(iter(self._waiting.items()))
+        project_id, waiters = next(iter(projects.items()))
+        waiter = waiters.popleft()
+        self._queue_depth -= 1
+        if waiters:
+            projects.move_to_end(project_id)
+        else:
+            del projects[project_id]
+        if projects:
+            self._waiting.move_to_end(user_id)
+        else:
+            del self._waiting[user_id]
+        return waiter
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiting and self._active < self.max_concurrency:
+            token_wait = (1 - self._tokens) / self.refill_per_second if self._tokens < 1 and self.refill_per_second > 0 else 0.0
+            wait = max(self._paused_until - now, token_wait)
+            if wait > 0:
+                self._schedule_wakeup(wait)
+                return
+            waiter = self._next_waiter()
+            if waiter.cancelled():
+                continue
+            self._tokens -= 1
+            self._active += 1
+            self.admitted += 1
+            waiter.set_result(None)
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._on_wakeup)
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+
+def _is_retryable(error: anthropic.APIStatusError | anthropic.APIConnectionError) -> bool:
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    code = error.status_code
+    return code in RATE_LIMITED_STATUS_CODES or code in TRANSIENT_STATUS_CODES or code >= 500
+
+
+def _retry_after(error: anthropic.APIStatusError | anthropic.APIConnectionError) -> float | None:
+    if not isinstance(error, anthropic.APIStatusError):
+        return None
+    try:
+        return float(error.response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+# Global instance
+llm_scheduler = LlmScheduler(
+    max_concurrency=config.llm_max_concurrency,
+    requests_per_minute=config.llm_requests_per_minute,
+    burst=config.llm_burst,
+    max_retries=config.llm_max_retries,
+)
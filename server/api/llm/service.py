@@ -1,14 +1,11 @@
-import anthropic
 from typing import AsyncGenerator
 from anthropic.types import MessageParam
 from anthropic.lib.streaming._types import MessageStreamEvent
-from .settings import config
+from .client import get_client
 
 
 async def generate_title(description: str) -> str:
-    client = anthropic.AsyncAnthropic(
-        api_key=config.anthropic_api_key
-    )
+    client = get_client()
     
     prompt = f"""You are a helpful assistant that generates concise, clear titles for tasks based on their descriptions.
 
@@ -46,7 +43,7 @@ Just return the title, nothing else.
     
 
 async def stream_events(messages: list[MessageParam]) -> AsyncGenerator[MessageStreamEvent, None]:
-    client = anthropic.AsyncAnthropic(api_key=config.anthropic_api_key)
+    client = get_client()
     async with client.messages.stream(
         max_tokens=1024,
         model="claude-opus-4-20250514",
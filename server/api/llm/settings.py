@@ -3,6 +3,14 @@ from api.settings import GlobalConfig
 
 class LLMConfig(GlobalConfig):
     anthropic_api_key: str
-    
+    anthropic_max_connections: int = 100
+    anthropic_max_keepalive_connections: int = 20
+    anthropic_keepalive_expiry_seconds: float = 30
+    anthropic_http2: bool = False
+    llm_max_concurrency: int = 16
+    llm_requests_per_minute: float = 50
+    llm_burst: int = 10
+    llm_max_retries: int = 5
+
 
 config = LLMConfig() 
\ No newline at end of file
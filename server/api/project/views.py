@@ -1,4 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from typing import Annotated
+from fastapi import APIRouter, HTTPException, Query, Response
+from api.database.utils import encode_cursor, decode_cursor
 from api.database.dependencies import DbSession
 from api.auth.dependencies import AuthenticatedUserId
 from github import Github, Auth
@@ -59,9 +62,22 @@ async def get_tasks(
     project_id: str,
     user_id: AuthenticatedUserId,
     db: DbSession,
+    response: Response,
+    limit: Annotated[int | None, Query(ge=1, le=200)] = None,
+    cursor: str | None = None,
 ) -> list[TaskPublic]:
+    """Newest tasks first. With a limit, a full page sets the X-Next-Cursor header to pass back as cursor."""
     project = await get(db, project_id)
     if project.user_id != user_id:
         raise HTTPException(status_code=403, detail="Forbidden")
-    tasks = await task_service.get_tasks(db, project.id)
-    return [TaskPublic.from_task(task) for task in tasks]
\ No newline at end of file
+    try:
+        before = None
+        if cursor:
+            created_at, last_task_id = decode_cursor(cursor)
+            before = (datetime.fromisoformat(created_at), int(last_task_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    tasks = await task_service.get_tasks(db, project.id, limit, before)
+    if limit is not None and len(tasks) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(tasks[-1].created_at.isoformat(), tasks[-1].id)
+    return [TaskPublic.from_task(task) for task in tasks]
@@ -4,6 +4,7 @@ from typing import Literal
 
 class GlobalConfig(BaseSettings):
     environment: Literal["local", "production"] = "production"
+    workers: int = 1
     
     model_config = SettingsConfigDict(
         env_file="../.env", 
@@ -4,6 +4,9 @@ from e2b_code_interpreter import AsyncSandbox
 from api.database.dependencies import async_session
 import api.task.service as task_service
 from api.task.settings import config
+from api.task.heartbeat_service import heartbeat_tracker
+from api.database.utils import utc_now
+from datetime import timedelta
 
 
 class SandboxCleanupService:
@@ -49,6 +52,11 @@ class SandboxCleanupService:
         async with async_session() as session:
             try:
                 idle_tasks = await task_service.get_idle_sandboxes(session, self.idle_minutes)
+                cutoff_time = utc_now() - timedelta(minutes=self.idle_minutes)
+                idle_tasks = [
+                    task for task in idle_tasks
+                    if (last_used_at := heartbeat_tracker.last_used_at(task.id)) is None or last_used_at < cutoff_time
+                ]
                 
                 if not idle_tasks:
                     return
@@ -56,6 +64,7 @@ class SandboxCleanupService:
                 for task in idle_tasks:
                     try:
                         await self._pause_sandbox(task.sandbox_id)  # type: ignore
+                        heartbeat_tracker.forget(task.id)
                         await task_service.update_sandbox_usage(session, task.id, "paused")
                     except Exception as e:
                         print(f"Failed to pause sandbox {task.sandbox_id}: {e}")
@@ -73,7 +82,7 @@ class SandboxCleanupService:
 
 
 # Global instance
-cleanup_service = SandboxCleanupService()
+cleanup_service = SandboxCleanupService(config.sandbox_idle_minutes)
 
 
 async def start_cleanup_service() -> None:
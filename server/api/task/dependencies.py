@@ -0,0 +1,47 @@
+from typing import Annotated, NamedTuple
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException
+from api.auth.dependencies import AuthenticatedUserId
+from api.database.dependencies import DbSession
+from api.database.models import Project, Task
+import api.task.service as task_service
+from .settings import config
+
+
+class TaskAccess(NamedTuple):
+    """Ids of a task the user owns; unlike the rows themselves these never change"""
+    task_id: int
+    project_id: int
+
+
+_access_cache: TTLCache[tuple[str, str], TaskAccess] = TTLCache(
+    maxsize=config.task_access_cache_size,
+    ttl=config.task_access_cache_ttl_seconds,
+)
+
+
+async def _load_owned_task(db: DbSession, task_id: str, user_id: str) -> tuple[Task, Project]:
+    owned = await task_service.get_for_user(db, task_id, user_id)
+    if owned is None:
+        raise HTTPException(status_code=403, detail="You are not allowed to access this task")
+    task, project = owned
+    _access_cache[(task_id, user_id)] = TaskAccess(task.id, project.id)
+    return owned
+
+
+async def get_owned_task(task_id: str, user_id: AuthenticatedUserId, db: DbSession) -> tuple[Task, Project]:
+    """The task and its project, loaded fresh in one query, for handlers that read their columns"""
+    return await _load_owned_task(db, task_id, user_id)
+
+
+async def get_task_access(task_id: str, user_id: AuthenticatedUserId, db: DbSession) -> TaskAccess:
+    """Ownership check for handlers that only need ids, served from a short-TTL cache"""
+    access = _access_cache.get((task_id, user_id))
+    if access is None:
+        task, project = await _load_owned_task(db, task_id, user_id)
+        access = TaskAccess(task.id, project.id)
+    return access
+
+
+OwnedTask = Annotated[tuple[Task, Project], Depends(get_owned_task)]
+AuthorizedTask = Annotated[TaskAccess, Depends(get_task_access)]
@@ -0,0 +1,27 @@
+from json.encoder import encode_basestring
+from typing import NamedTuple
+from .models import TaskEvent, TextDeltaEvent
+
+TEXT_DELTA_PREFIX = b'{"type":"text_delta","text":'
+
+
+class EncodedEvent(NamedTuple):
+    """A TaskEvent serialized once at push time; fan-out, replay and the SSE writer reuse the bytes"""
+    type: str
+    data: bytes
+
+
+def encode_event(event: TaskEvent) -> EncodedEvent:
+    if isinstance(event, TextDeltaEvent):
+        return EncodedEvent("text_delta", TEXT_DELTA_PREFIX + encode_basestring(event.text).encode() + b"}")
+    return EncodedEvent(event.type, event.model_dump_json().encode())
+
+
+def text_delta_body(event: EncodedEvent) -> bytes:
+    """The escaped text of an encoded text delta, without the surrounding quotes"""
+    return event.data[len(TEXT_DELTA_PREFIX) + 1:-2]
+
+
+def merge_text_deltas(events: list[EncodedEvent]) -> EncodedEvent:
+    """Concatenating escaped JSON string bodies yields the escaped concatenation, so nothing is re-encoded"""
+    return EncodedEvent("text_delta", TEXT_DELTA_PREFIX + b'"' + b"".join(text_delta_body(event) for event in events) + b'"}')
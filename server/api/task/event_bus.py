@@ -0,0 +1,160 @@
+import asyncio
+import json
+from typing import Any, Callable, Literal, Protocol
+import nanoid
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from api.database.dependencies import engine
+
+
+class BusMessage(BaseModel):
+    task_id: int
+    kind: Literal["event", "run_start", "persisted", "close"]
+    seq: int
+    event_type: str | None = None
+    data: bytes | None = None
+
+
+Deliver = Callable[[BusMessage], None]
+
+
+class EventBus(Protocol):
+    async def start(self) -> None: ...
+    async def stop(self) -> None: ...
+    async def publish(self, message: BusMessage) -> None: ...
+
+
+class InMemoryEventBus:
+    """Delivers messages straight to this process' hubs; only valid with a single API worker"""
+
+    def __init__(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, message: BusMessage) -> None:
+        self.deliver(message)
+
+
+class PostgresEventBus:
+    """Fans messages out to every API process through Postgres LISTEN/NOTIFY.
+
+    Publishers never deliver locally; every process, including the publisher, receives the
+    notification on its listener connection, so all hubs see the same order. publish only
+    queues the message: one publisher task sends everything queued so far in one transaction
+    on one connection, so messages leave in the order their sequence numbers were claimed and a
+    burst of text deltas costs one commit. Payloads over the NOTIFY size limit are split into
+    chunks, which Postgres delivers contiguously and in order within the transaction.
+    """
+
+    CHANNEL = "task_events"
+    MAX_PAYLOAD_SIZE = 7_900  # Postgres rejects NOTIFY payloads of 8000 bytes or more
+    CHUNK_PREFIX = "#"
+
+    def __init__(self, deliver: Deliver, reconnect_delay_seconds: float = 1.0, max_batch_size: int = 500):
+        self.deliver = deliver
+        self.reconnect_delay_seconds = reconnect_delay_seconds
+        self.max_batch_size = max_batch_size
+        self.running = False
+        self._connection: AsyncConnection | None = None
+        self._reconnect_task: asyncio.Task[None] | None = None
+        self._partial_chunks: dict[str, list[str]] = {}
+        self._outbox: asyncio.Queue[BusMessage | None] = asyncio.Queue()
+        self._publisher_task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        self.running = True
+        await self._listen()
+        self._publisher_task = asyncio.create_task(self._publish_loop())
+        print(f"Started postgres event bus (channel={self.CHANNEL})")
+
+    async def stop(self) -> None:
+        self.running = False
+        if self._publisher_task:
+            self._outbox.put_nowait(None)
+            await self._publisher_task
+            self._publisher_task = None
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._connection:
+            await self._connection.close()
+            self._connection = None
+        print("Stopped postgres event bus")
+
+    async def publish(self, message: BusMessage) -> None:
+        self._outbox.put_nowait(message)
+
+    async def _publish_loop(self) -> None:
+        while True:
+            batch = [await self._outbox.get()]
+            while not self._outbox.empty() and len(batch) < self.max_batch_size:
+                batch.append(self._outbox.get_nowait())
+            messages = [message for message in batch if message is not None]
+            if messages:
+                try:
+                    await self._send(messages)
+                except Exception as e:
+                    print(f"Failed to publish {len(messages)} event bus messages: {e}")
+            if None in batch:
+                return
+
+    async def _send(self, messages: list[BusMessage]) -> None:
+        payloads = [chunk for message in messages for chunk in self._payloads(message)]
+        async with engine.connect() as connection:
+            await connection.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                [{"channel": self.CHANNEL, "payload": payload} for payload in payloads],
+            )
+            await connection.commit()
+
+    def _payloads(self, message: BusMessage) -> list[str]:
+        payload = json.dumps(message.model_dump(mode="json"))
+        if len(payload) <= self.MAX_PAYLOAD_SIZE:
+            return [payload]
+        chunk_id = nanoid.generate(size=12)
+        chunk_size = self.MAX_PAYLOAD_SIZE - 64
+        parts = [payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+        return [f"{self.CHUNK_PREFIX}{chunk_id}:{index}:{len(parts)}:{part}" for index, part in enumerate(parts)]
+
+    async def _listen(self) -> None:
+        self._connection = await engine.connect()
+        raw_connection = await self._connection.get_raw_connection()
+        driver_connection: Any = raw_connection.driver_connection
+        driver_connection.add_termination_listener(self._on_termination)
+        await driver_connection.add_listener(self.CHANNEL, self._on_notification)
+
+    def _on_termination(self, *args: Any) -> None:
+        if self.running and not self._reconnect_task:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        self._partial_chunks.clear()
+        while self.running:
+            print("Event bus listener connection lost, reconnecting")
+            try:
+                if self._connection:
+                    await self._connection.invalidate()
+                await self._listen()
+                break
+            except Exception as e:
+                print(f"Failed to reconnect event bus listener: {e}")
+                await asyncio.sleep(self.reconnect_delay_seconds)
+        self._reconnect_task = None
+
+    def _on_notification(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        if payload.startswith(self.CHUNK_PREFIX):
+            chunk_id, index, total, part = payload[len(self.CHUNK_PREFIX):].split(":", 3)
+            chunks = self._partial_chunks.setdefault(chunk_id, [])
+            chunks.append(part)
+            if int(index) + 1 < int(total):
+                return
+            payload = "".join(self._partial_chunks.pop(chunk_id))
+        try:
+            self.deliver(BusMessage.model_validate_json(payload))
+        except Exception as e:
+            print(f"Dropping malformed event bus message: {e}")
@@ -1,9 +1,11 @@
 import nanoid
 from api.database.models import Project, Task
-from .settings import REPO_PATH
+from .settings import REPO_PATH, config
 from api.agent_tools.executor import SandboxExecutor
 from api.agent_tools.loop import run_agent_loop
+from api.llm.scheduler import Tenant
 from api.agent_tools.tools import AgentToolbox
+from api.agent_tools.output_stream import ToolOutputStream
 from anthropic.types import MessageParam
 from api.database.dependencies import async_session
 import api.task.queue_service as queue_service
@@ -26,14 +28,17 @@ def with_sandbox(sandbox_id_attr: Literal["sandbox_id"] | None = None) -> Callab
                 raise ValueError("First argument must be a Task instance")
             sandbox_id = getattr(task, sandbox_id_attr) if sandbox_id_attr else None
             
-            async with async_session() as session:
-                async with SandboxExecutor(task.id, session, sandbox_id) as executor:
-                    try:
-                        return await func(*args, executor, session, **kwargs)
-                    except Exception as e:
-                        print(f"Error running agent flow: {e}")
-                    finally:
-                        await task_service.update_status(session, task.id, "pending_review")
+            try:
+                async with async_session() as session:
+                    async with SandboxExecutor(task.id, session, sandbox_id) as executor:
+                        try:
+                            return await func(*args, executor, session, **kwargs)
+                        except Exception as e:
+                            print(f"Error running agent flow: {e}")
+                        finally:
+                            await task_service.update_status(session, task.id, "pending_review")
+            finally:
+                await queue_service.close(task.id)
         return wrapper
     return decorator
 
@@ -51,7 +56,7 @@ async def start_task_flow(task: Task, project: Project, gh_access_token: str, sk
     clone_command = f"git clone {project.repo_clone_url} {REPO_PATH} && cd {REPO_PATH} && git checkout -b fleet-{nanoid.generate(size=8)}"
     clone_output = await _run_setup_command(executor,task.id, clone_command, f"Cloning repository {project.repo_name}")
     try:
-        rules_output = await _run_setup_command(executor,task.id, f"cat {REPO_PATH}/{project.rules_file_path}", "Reading rules file")
+        rules_output = await _run_setup_command(executor,task.id, f"cat {REPO_PATH}/{project.rules_file_path}", "Reading rules file", raise_on_error=True)
     except CommandExitException:
         rules_output = "No rules file found"
     setup_output = await _run_setup_command(executor, task.id,  project.setup_script_path,  "Running setup script")
@@ -75,24 +80,26 @@ async def start_task_flow(task: Task, project: Project, gh_access_token: str, sk
     if not skip_agent:
         toolbox = AgentToolbox(executor)
         starting_messages: list[MessageParam] = [{ "role": "user", "content": task.description }]
-        await run_agent_loop(task.id, toolbox, messages=starting_messages, user_rules_file_content=rules_output)
+        tenant = Tenant(project.user_id, project.id)
+        await run_agent_loop(task.id, tenant, toolbox, messages=starting_messages, user_rules_file_content=rules_output)
 
 
 @with_sandbox("sandbox_id")
 async def run_agent_flow(
     task: Task, 
     starting_messages: list[MessageParam], 
-    rules_file_path: str, 
+    project: Project, 
     executor: SandboxExecutor, 
     session: AsyncSession
 ) -> None:
     await task_service.update_status(session, task.id, "running")
     toolbox = AgentToolbox(executor)
     try:
-        rules_output = await executor.sbx.files.read(REPO_PATH + "/" + rules_file_path)
+        rules_output = await executor.sbx.files.read(REPO_PATH + "/" + project.rules_file_path)
     except NotFoundException:
         rules_output = "No rules file found"
-    await run_agent_loop(task.id, toolbox, messages=starting_messages, user_rules_file_content=rules_output)
+    tenant = Tenant(project.user_id, project.id)
+    await run_agent_loop(task.id, tenant, toolbox, messages=starting_messages, user_rules_file_content=rules_output)
 
 
 async def _run_setup_command(
@@ -108,4 +115,10 @@ async def _run_setup_command(
         tool_input=title
     )
     await queue_service.push(task_id, tool_input) # type: ignore
-    return await executor.run(command, raise_on_error)
\ No newline at end of file
+    async with ToolOutputStream(task_id, SETUP_TOOL_ID) as output_stream:
+        return await executor.run(
+            command,
+            raise_on_error,
+            on_output=output_stream.write,
+            max_timeout_seconds=config.setup_command_max_timeout_seconds,
+        )
\ No newline at end of file
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Literal
+from api.database.dependencies import async_session
+from api.database.utils import utc_now
+import api.task.service as task_service
+from api.task.settings import config
+
+SandboxUsage = tuple[Literal["running", "paused"], datetime]
+
+
+class SandboxHeartbeatTracker:
+    """Write-behind tracker for sandbox activity.
+
+    Executors record usage in memory; a background loop flushes the latest usage per task
+    to the database in one batched UPDATE every few seconds. Flushed usage older than the idle
+    window is pruned, since it can no longer keep a sandbox from being paused.
+    """
+
+    def __init__(self, flush_interval_seconds: float = 5, idle_minutes: int = 5):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.idle_minutes = idle_minutes
+        self.running = False
+        self.task: asyncio.Task[None] | None = None
+        self._pending: dict[int, SandboxUsage] = {}
+        self._last_used: dict[int, SandboxUsage] = {}
+
+    def record(self, task_id: int, sandbox_state: Literal["running", "paused"] = "running") -> None:
+        usage = (sandbox_state, utc_now())
+        self._pending[task_id] = usage
+        self._last_used[task_id] = usage
+
+    def forget(self, task_id: int) -> None:
+        """Drop unflushed usage, e.g. after the sandbox was paused directly in the database"""
+        self._pending.pop(task_id, None)
+        self._last_used.pop(task_id, None)
+
+    def last_used_at(self, task_id: int) -> datetime | None:
+        """Latest activity recorded by this process, which may be newer than the database"""
+        usage = self._last_used.get(task_id)
+        return usage[1] if usage else None
+
+    async def start(self) -> None:
+        """Start the background flush loop"""
+        if self.running:
+            return
+
+        self.running = True
+        self.task = asyncio.create_task(self._flush_loop())
+        print(f"Started sandbox heartbeat tracker (flush_interval={self.flush_interval_seconds}s)")
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write out anything still pending"""
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        print("Stopped sandbox heartbeat tracker")
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            async with async_session() as session:
+                await task_service.update_sandbox_usage_batch(session, batch)
+        except Exception:
+            self._pending = {**batch, **self._pending}
+            raise
+
+    async def _flush_loop(self) -> None:
+        while self.running:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing sandbox heartbeats: {e}")
+            self._prune()
+
+    def _prune(self) -> None:
+        cutoff_time = utc_now() - timedelta(minutes=self.idle_minutes)
+        self._last_used = {
+            task_id: usage for task_id, usage in self._last_used.items()
+            if task_id in self._pending or usage[1] >= cutoff_time
+        }
+
+
+# Global instance
+heartbeat_tracker = SandboxHeartbeatTracker(config.sandbox_heartbeat_flush_seconds, config.sandbox_idle_minutes)
+
+
+async def start_heartbeat_tracker() -> None:
+    """Start the global heartbeat tracker"""
+    await heartbeat_tracker.start()
+
+
+async def stop_heartbeat_tracker() -> None:
+    """Stop the global heartbeat tracker"""
+    await heartbeat_tracker.stop()
@@ -0,0 +1,73 @@
+import json
+from dataclasses import dataclass
+from anthropic.types import MessageParam
+from cachetools import LRUCache
+from api.task.settings import config
+
+
+@dataclass
+class CachedHistory:
+    """A task's materialized Anthropic message list, tagged with the database state it reflects"""
+    messages: list[MessageParam]
+    message_count: int
+    last_message_id: int | None
+    size: int
+
+
+def _estimate_size(message: MessageParam) -> int:
+    return len(json.dumps(message, default=str))
+
+
+_cache: LRUCache[int, CachedHistory] = LRUCache(
+    maxsize=config.history_cache_max_bytes,
+    getsizeof=lambda history: history.size,
+)
+
+
+def get(task_id: int, message_count: int, last_message_id: int | None) -> list[MessageParam] | None:
+    """The cached history, or None when it is missing or no longer matches the database.
+
+    Another API worker may have written messages for this task, so callers pass the current
+    message count and newest message id and a cached copy is only used if both match.
+    """
+    history = _cache.get(task_id)
+    if history is None or history.message_count != message_count or history.last_message_id != last_message_id:
+        return None
+    return list(history.messages)
+
+
+def _store(task_id: int, history: CachedHistory) -> None:
+    """(Re)insert so the LRU accounts for the size; a transcript larger than the whole cache isn't kept"""
+    try:
+        _cache[task_id] = history
+    except ValueError:
+        _cache.pop(task_id, None)
+
+
+def put(task_id: int, messages: list[MessageParam], message_count: int, last_message_id: int | None) -> None:
+    _store(task_id, CachedHistory(
+        messages=list(messages),
+        message_count=message_count,
+        last_message_id=last_message_id,
+        size=sum(_estimate_size(message) for message in messages),
+    ))
+
+
+def append(task_id: int, message_id: int, message: MessageParam | None) -> None:
+    """Extend a cached history with a newly persisted message; message is None if it has no content blocks"""
+    history = _cache.get(task_id)
+    if history is None:
+        return
+    if history.last_message_id is not None and message_id <= history.last_message_id:
+        invalidate(task_id)
+        return
+    history.message_count += 1
+    history.last_message_id = message_id
+    if message is not None:
+        history.messages.append(message)
+        history.size += _estimate_size(message)
+    _store(task_id, history)
+
+
+def invalidate(task_id: int) -> None:
+    _cache.pop(task_id, None)
@@ -61,12 +61,19 @@ class TextDeltaEvent(BaseModel):  # Streaming only
     text: str
 
 
+class ToolOutputDeltaEvent(BaseModel):  # Streaming only
+    type: Literal["tool_output_delta"] = "tool_output_delta"
+    tool_id: str
+    output: str
+    truncated: bool = False
+
+
 class TextBlock(BaseModel):  # DB storage only
     type: Literal["text"] = "text"
     text: str
 
 
-TaskEvent = Union[MessageStartEvent, MessageStopEvent, ErrorEvent, ToolInputBlock, ToolResultBlock, TextDeltaEvent]
+TaskEvent = Union[MessageStartEvent, MessageStopEvent, ErrorEvent, ToolInputBlock, ToolResultBlock, TextDeltaEvent, ToolOutputDeltaEvent]
 # DB storage blocks
 ContentBlock = Union[ToolInputBlock, ToolResultBlock, TextBlock]
 
@@ -138,4 +145,24 @@ def create_message_param_from_message(message: Message, blocks: list[ContentBloc
     return {
         "role": message.role,
         "content": [create_anthropic_message_content_from_db(block) for block in blocks]
-    }
\ No newline at end of file
+    }
+
+
+def create_anthropic_message_content(block: ContentBlock) -> ToolUseBlockParam | ToolResultBlockParam | TextBlockParam:
+    """Same params create_anthropic_message_content_from_db builds once the block is stored"""
+    if block.type == "text":
+        return TextBlockParam(text=block.text, type="text")
+    elif block.type == "tool_input":
+        return ToolUseBlockParam(
+            id=block.tool_id,
+            input=block.tool_input if isinstance(block.tool_input, str) else block.tool_input.model_dump(), # type: ignore
+            name=block.tool_name,
+            type="tool_use"
+        )
+    elif block.type == "tool_result":
+        return ToolResultBlockParam(
+            tool_use_id=block.tool_id,
+            content=block.tool_result,
+            type="tool_result"
+        )
+    raise ValueError(f"Unknown block type: {block.type}")
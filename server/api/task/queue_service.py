@@ -1,21 +1,255 @@
 import asyncio
+import time
 from typing import AsyncGenerator
+from pydantic import BaseModel
 from .models import TaskEvent, create_task_event_from_anthropic, ErrorEvent
+from .encoding import EncodedEvent, encode_event, merge_text_deltas
+from .settings import config
+from .event_bus import BusMessage, EventBus, InMemoryEventBus, PostgresEventBus
 from anthropic.lib.streaming._types import MessageStreamEvent
 
-_queues: dict[int, asyncio.Queue[TaskEvent]] = {}
 
+class TaskEventHub:
+    """Broadcast hub for one task: a bounded, sequence-numbered ring buffer shared by every subscriber.
 
-def create(task_id: int) -> None:
-    if task_id not in _queues:
-        _queues[task_id] = asyncio.Queue()
+    Each event is stored once, already encoded; subscribers only keep a cursor (the last sequence number they read),
+    so one push serves any number of readers. The buffer is capped both by event count and by the
+    serialized size of its events, dropping the oldest events first.
+    """
 
+    def __init__(self, capacity: int, max_bytes: int, max_out_of_order: int = 64):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.max_out_of_order = max_out_of_order
+        self._early: dict[int, EncodedEvent] = {}
+        self._slots: list[EncodedEvent | None] = [None] * capacity
+        self.first_seq = 1
+        self.next_seq = 1
+        self.next_publish_seq = 1
+        self.run_start_seq = 1
+        self.persisted_seq = 0
+        self.buffered_bytes = 0
+        self.subscribers = 0
+        self.closed = False
+        self.last_active_at = time.monotonic()
+        self.changed = asyncio.Event()
 
-async def push(task_id: int, event: TaskEvent) -> None:
-    if task_id not in _queues:
-        _queues[task_id] = asyncio.Queue()
-    
-    await _queues[task_id].put(event)
+    def _notify(self) -> None:
+        self.last_active_at = time.monotonic()
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def _drop_oldest(self) -> None:
+        slot = self._slots[self.first_seq % self.capacity]
+        if slot is not None:
+            self.buffered_bytes -= len(slot.data)
+        self._slots[self.first_seq % self.capacity] = None
+        self.first_seq += 1
+
+    def start_run(self, seq: int) -> None:
+        self.run_start_seq = seq
+        self.closed = False
+        self._notify()
+
+    def mark_persisted(self, seq: int) -> None:
+        self.persisted_seq = max(self.persisted_seq, seq)
+        self.last_active_at = time.monotonic()
+
+    def close(self) -> None:
+        """Subscribers drain what is buffered and then finish; the events stay available for replay"""
+        self.closed = True
+        self._notify()
+
+    def claim_seq(self) -> int:
+        """Sequence number for the next published event, which may not have been delivered back yet"""
+        seq = max(self.next_seq, self.next_publish_seq)
+        self.next_publish_seq = seq + 1
+        return seq
+
+    def append(self, event: EncodedEvent, seq: int) -> None:
+        """Add the event with sequence number seq. Events that arrive a little early wait for the
+        gap before them to fill; the ring restarts when the numbering jumps back or the gap doesn't
+        fill (missed messages, or a producer in another process restarted)."""
+        if seq < self.next_seq or (self.next_seq == self.first_seq and not self._early):
+            self._early.clear()
+            self._restart_at(seq)
+        self._early[seq] = event
+        if seq > self.next_seq:
+            if seq - self.next_seq <= self.max_out_of_order and len(self._early) <= self.max_out_of_order:
+                return
+            self._restart_at(min(self._early))
+        while self.next_seq in self._early:
+            self._store(self._early.pop(self.next_seq))
+        self._notify()
+
+    def _restart_at(self, seq: int) -> None:
+        self._slots = [None] * self.capacity
+        self.buffered_bytes = 0
+        self.first_seq = self.next_seq = seq
+
+    def _store(self, event: EncodedEvent) -> None:
+        seq = self.next_seq
+        if self.next_seq - self.first_seq >= self.capacity:
+            self._drop_oldest()
+        self._slots[seq % self.capacity] = event
+        self.buffered_bytes += len(event.data)
+        self.next_seq += 1
+        while self.buffered_bytes > self.max_bytes and self.next_seq - self.first_seq > 1:
+            self._drop_oldest()
+
+    def read_after(self, seq: int) -> list[tuple[int, EncodedEvent]]:
+        """Events newer than seq; a subscriber that fell behind the ring resumes at the oldest buffered event"""
+        if seq >= self.next_seq:
+            seq = self.first_seq - 1
+        start = max(seq + 1, self.first_seq)
+        return [(s, self._slots[s % self.capacity]) for s in range(start, self.next_seq)] # type: ignore
+
+    def subscribe(self, last_event_id: int | None = None) -> "Subscription":
+        """Resume after last_event_id, or else after the last event whose content the messages
+        endpoint already returns (or from the start of this run)"""
+        if last_event_id is None:
+            last_event_id = max(self.run_start_seq - 1, self.persisted_seq)
+        return Subscription(self, last_event_id)
+
+
+class Subscription:
+    def __init__(self, hub: TaskEventHub, cursor: int):
+        self.hub = hub
+        self.cursor = cursor
+
+    def __enter__(self) -> "Subscription":
+        self.hub.subscribers += 1
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.hub.subscribers -= 1
+        self.hub.last_active_at = time.monotonic()
+
+    async def read(self, timeout: float | None = None) -> list[tuple[int, EncodedEvent]]:
+        """Wait until at least one unread event is available and return every unread event.
+
+        Returns an empty list if timeout (in seconds) passes first, or once the hub is closed and drained.
+        """
+        while True:
+            changed = self.hub.changed
+            events = self.hub.read_after(self.cursor)
+            if events:
+                self.cursor = events[-1][0]
+                return events
+            if self.hub.closed:
+                return []
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+
+
+class QueueStats(BaseModel):
+    live_hubs: int
+    open_hubs: int
+    subscribers: int
+    buffered_events: int
+    buffered_bytes: int
+
+
+_hubs: dict[int, TaskEventHub] = {}
+
+
+def _get_or_create_hub(task_id: int) -> TaskEventHub:
+    hub = _hubs.get(task_id)
+    if hub is None:
+        hub = _hubs[task_id] = TaskEventHub(config.event_buffer_size, config.event_buffer_max_bytes)
+    return hub
+
+
+def _deliver(message: BusMessage) -> None:
+    hub = _get_or_create_hub(message.task_id)
+    if message.kind == "run_start":
+        hub.start_run(message.seq)
+    elif message.kind == "persisted":
+        hub.mark_persisted(message.seq)
+    elif message.kind == "close":
+        hub.close()
+    elif message.event_type is not None and message.data is not None:
+        hub.append(EncodedEvent(message.event_type, message.data), message.seq)
+
+
+def _create_bus() -> EventBus:
+    if config.event_bus == "postgres":
+        return PostgresEventBus(_deliver)
+    return InMemoryEventBus(_deliver)
+
+
+_bus = _create_bus()
+_eviction_task: asyncio.Task[None] | None = None
+
+
+def get_stats() -> QueueStats:
+    return QueueStats(
+        live_hubs=len(_hubs),
+        open_hubs=sum(1 for hub in _hubs.values() if not hub.closed),
+        subscribers=sum(hub.subscribers for hub in _hubs.values()),
+        buffered_events=sum(hub.next_seq - hub.first_seq for hub in _hubs.values()),
+        buffered_bytes=sum(hub.buffered_bytes for hub in _hubs.values()),
+    )
+
+
+def evict_idle_hubs(ttl_seconds: float) -> int:
+    """Drop hubs nobody is reading that have been inactive for longer than ttl_seconds"""
+    cutoff = time.monotonic() - ttl_seconds
+    idle = [task_id for task_id, hub in _hubs.items() if hub.subscribers == 0 and hub.last_active_at < cutoff]
+    for task_id in idle:
+        del _hubs[task_id]
+    return len(idle)
+
+
+async def _eviction_loop() -> None:
+    while True:
+        await asyncio.sleep(config.event_hub_sweep_interval_seconds)
+        evicted = evict_idle_hubs(config.event_hub_ttl_seconds)
+        if evicted:
+            print(f"Evicted {evicted} idle event hubs ({get_stats()})")
+
+
+async def start() -> None:
+    global _eviction_task
+    await _bus.start()
+    _eviction_task = asyncio.create_task(_eviction_loop())
+
+
+async def stop() -> None:
+    if _eviction_task:
+        _eviction_task.cancel()
+        try:
+            await _eviction_task
+        except asyncio.CancelledError:
+            pass
+    await _bus.stop()
+
+
+async def create(task_id: int) -> None:
+    """Mark the start of a new agent run; readers without a Last-Event-ID start here"""
+    hub = _get_or_create_hub(task_id)
+    await _bus.publish(BusMessage(task_id=task_id, kind="run_start", seq=max(hub.next_seq, hub.next_publish_seq)))
+
+
+async def mark_persisted(task_id: int) -> None:
+    """Record that everything pushed so far is saved, so new readers without a Last-Event-ID start after it"""
+    hub = _get_or_create_hub(task_id)
+    await _bus.publish(BusMessage(task_id=task_id, kind="persisted", seq=max(hub.next_seq, hub.next_publish_seq) - 1))
+
+
+async def close(task_id: int) -> None:
+    """Mark the end of the current agent run; streams finish once they have sent everything"""
+    hub = _get_or_create_hub(task_id)
+    await _bus.publish(BusMessage(task_id=task_id, kind="close", seq=max(hub.next_seq, hub.next_publish_seq)))
+
+
+async def push(task_id: int, event: TaskEvent) -> int:
+    seq = _get_or_create_hub(task_id).claim_seq()
+    encoded = encode_event(event)
+    await _bus.publish(BusMessage(task_id=task_id, kind="event", seq=seq, event_type=encoded.type, data=encoded.data))
+    return seq
 
 
 async def push_message_stream_event(task_id: int, event: MessageStreamEvent) -> None:
@@ -24,25 +258,75 @@ async def push_message_stream_event(task_id: int, event: MessageStreamEvent) ->
         await push(task_id, task_event)
 
 
-async def stream(task_id: int) -> AsyncGenerator[TaskEvent, None]:
-    queue = _queues.get(task_id)
-    if queue is None:
-        return
+async def stream(task_id: int, last_event_id: int | None = None) -> AsyncGenerator[tuple[int, EncodedEvent], None]:
+    """Never bails out early: the run may have started in another process and not reached this one yet"""
+    hub = _get_or_create_hub(task_id)
+    with hub.subscribe(last_event_id) as subscription:
+        while events := await subscription.read():
+            for seq, event in events:
+                yield seq, event
+
+
+def _coalesce_text_deltas(events: list[tuple[int, EncodedEvent]], max_bytes: int) -> list[tuple[int, EncodedEvent]]:
+    """Merge runs of consecutive text deltas into one event carrying the last merged sequence number"""
+    coalesced: list[tuple[int, EncodedEvent]] = []
+    run: list[tuple[int, EncodedEvent]] = []
+    run_bytes = 0
+
+    def flush() -> None:
+        nonlocal run, run_bytes
+        if len(run) == 1:
+            coalesced.append(run[0])
+        elif run:
+            coalesced.append((run[-1][0], merge_text_deltas([event for _, event in run])))
+        run, run_bytes = [], 0
+
+    for seq, event in events:
+        if event.type == "text_delta":
+            run.append((seq, event))
+            run_bytes += len(event.data)
+            if run_bytes >= max_bytes:
+                flush()
+        else:
+            flush()
+            coalesced.append((seq, event))
+    flush()
+    return coalesced
+
+
+async def _read_coalescing_window(subscription: Subscription) -> list[tuple[int, EncodedEvent]]:
+    """Read the next batch; while it ends in text deltas keep collecting until the window closes,
+    the trailing deltas reach the size cap or a non-delta event arrives"""
+    events = await subscription.read()
+    window_seconds = config.sse_coalesce_window_ms / 1000
+    if not events or window_seconds <= 0:
+        return events
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + window_seconds
+    trailing_bytes = 0
+    batch = events
     while True:
-        try:
-            item = await queue.get()
-            yield item
-        except asyncio.QueueShutDown:
-            break
+        for _, event in batch:
+            trailing_bytes = trailing_bytes + len(event.data) if event.type == "text_delta" else 0
+        remaining = deadline - loop.time()
+        if batch[-1][1].type != "text_delta" or trailing_bytes >= config.sse_coalesce_max_bytes or remaining <= 0:
+            return events
+        batch = await subscription.read(remaining)
+        if not batch:
+            return events
+        events += batch
 
 
-async def stream_response(task_id: int) -> AsyncGenerator[str, None]:
+async def stream_response(task_id: int, last_event_id: int | None = None) -> AsyncGenerator[bytes, None]:
     try:
-        async for task_event in stream(task_id):
-            yield f"data: {task_event.model_dump_json()}\n\n"
+        hub = _get_or_create_hub(task_id)
+        with hub.subscribe(last_event_id) as subscription:
+            while events := await _read_coalescing_window(subscription):
+                yield b"".join(
+                    b"id: %d\ndata: %b\n\n" % (seq, event.data)
+                    for seq, event in _coalesce_text_deltas(events, config.sse_coalesce_max_bytes)
+                )
     except Exception as e:
         error_event = ErrorEvent(type="error", error_message=str(e))
-        yield f"data: {error_event.model_dump_json()}\n\n"
-
-
-        
\ No newline at end of file
+        yield f"data: {error_event.model_dump_json()}\n\n".encode()
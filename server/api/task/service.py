@@ -1,10 +1,12 @@
-from datetime import timedelta
-from sqlalchemy import cast, DateTime
-from typing import Sequence, Literal
+from datetime import datetime, timedelta
+from anthropic.types import MessageParam
+from sqlalchemy import func, cast, insert, update, or_, literal, tuple_, values, column, select as core_select, DateTime, String, Integer, Boolean, JSON
+from typing import Any, Mapping, Sequence, Literal
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlmodel import select, desc
-from api.database.models import Task, Message, ContentBlock
-from .models import ContentBlock as ContentBlockModel
+from sqlmodel import select, desc, col
+from api.database.models import Project, Task, Message, ContentBlock
+from .models import ContentBlock as ContentBlockModel, create_anthropic_message_content, create_message_param_from_message
+from . import history_cache
 from api.database.utils import utc_now
 
 
@@ -19,6 +21,7 @@ async def create(
     )
     session.add(task)
     await session.commit()
+    history_cache.put(task.id, [], 0, None)
     return task
 
 
@@ -30,6 +33,21 @@ async def get(
     return (await session.exec(query)).one()
 
 
+async def get_for_user(
+    session: AsyncSession,
+    external_task_id: str,
+    user_id: str,
+) -> tuple[Task, Project] | None:
+    """The task and its project in one query, or None unless the project belongs to user_id"""
+    query = (
+        select(Task, Project)
+        .join(Project, col(Project.id) == col(Task.project_id))
+        .where(col(Task.external_id) == external_task_id, col(Project.user_id) == user_id)
+    )
+    row = (await session.exec(query)).first()
+    return (row[0], row[1]) if row else None
+
+
 async def get_all_for_project(
     session: AsyncSession,
     project_id: int,
@@ -43,10 +61,9 @@ async def update_title(
     external_task_id: str,
     title: str,
 ) -> None:
-    query = select(Task).where(Task.external_id == external_task_id)
-    task = (await session.exec(query)).one()
-    task.title = title
-    await session.commit() 
+    query = update(Task).where(col(Task.external_id) == external_task_id).values(title=title).returning(col(Task.id))
+    (await session.exec(query)).one()
+    await session.commit()
 
 
 async def update_sandbox_id(
@@ -54,9 +71,8 @@ async def update_sandbox_id(
     task_id: int,
     sandbox_id: str,
 ) -> None:
-    query = select(Task).where(Task.id == task_id)
-    task = (await session.exec(query)).one()
-    task.sandbox_id = sandbox_id
+    query = update(Task).where(col(Task.id) == task_id).values(sandbox_id=sandbox_id).returning(col(Task.id))
+    (await session.exec(query)).one()
     await session.commit()
 
 
@@ -65,13 +81,45 @@ async def update_sandbox_usage(
     task_id: int,
     sandbox_state: Literal["running", "paused"] = "running",
 ) -> None:
-    query = select(Task).where(Task.id == task_id)
-    task = (await session.exec(query)).one()
-    task.sandbox_state = sandbox_state
-    task.last_used_at = utc_now()
+    query = (
+        update(Task)
+        .where(col(Task.id) == task_id)
+        .values(sandbox_state=sandbox_state, last_used_at=utc_now())
+        .returning(col(Task.id))
+    )
+    (await session.exec(query)).one()
+    await session.commit()
+
+
+async def update_sandbox_usage_batch(
+    session: AsyncSession,
+    usage: Mapping[int, tuple[Literal["running", "paused"], datetime]],
+) -> None:
+    """Write many tasks' sandbox usage in one UPDATE ... FROM (VALUES ...).
+
+    Rows already carrying newer usage (e.g. a pause written directly) are left alone.
+    """
+    rows = values(
+        column("id", Integer),
+        column("sandbox_state", String),
+        column("last_used_at", DateTime),
+        name="usage",
+    ).data([(task_id, sandbox_state, last_used_at) for task_id, (sandbox_state, last_used_at) in usage.items()])
+    query = (
+        update(Task)
+        .values(sandbox_state=rows.c.sandbox_state, last_used_at=rows.c.last_used_at)
+        .where(col(Task.id) == rows.c.id)
+        .where(or_(col(Task.last_used_at).is_(None), cast(Task.last_used_at, DateTime) < rows.c.last_used_at))
+    )
+    await session.exec(query)
     await session.commit()
 
 
+def _inline_literal(value: str) -> Any:
+    """Rendered into the SQL text so even generic prepared plans can match a partial index on it"""
+    return literal(value, literal_execute=True)
+
+
 async def get_idle_sandboxes(
     session: AsyncSession,
     idle_minutes: int = 5,
@@ -81,75 +129,169 @@ async def get_idle_sandboxes(
     query = (
         select(Task)
         .where(Task.sandbox_id != None)
-        .where(Task.sandbox_state == "running")
+        .where(col(Task.sandbox_state) == _inline_literal("running"))
         .where(Task.last_used_at != None)
         .where(cast(Task.last_used_at, DateTime) < cutoff_time)
     )
     return (await session.exec(query)).all()
 
 
-async def create_message(
+NewMessage = tuple[Literal["user", "assistant"], int, Sequence[ContentBlockModel]]
+
+
+def _content_block_row(external_message_id: str, sequence_number: int, block: ContentBlockModel) -> tuple[Any, ...] | None:
+    if block.type == "text":
+        return (external_message_id, "text", sequence_number, None, None, {"text": block.text}, False)
+    elif block.type == "tool_input":
+        tool_input = block.tool_input if isinstance(block.tool_input, str) else block.tool_input.model_dump()
+        return (external_message_id, "tool_input", sequence_number, block.tool_id, block.tool_name, {"tool_input": tool_input}, False)
+    elif block.type == "tool_result":
+        return (external_message_id, "tool_result", sequence_number, block.tool_id, None, {"tool_result": block.tool_result}, block.is_error)
+    return None
+
+
+async def create_messages(
     session: AsyncSession,
     task_id: int,
-    role: Literal["user", "assistant"],
-    message_order: int,
-) -> Message:
-    message = Message(
-        task_id=task_id,
-        role=role,
-        message_order=message_order,
+    messages: Sequence[NewMessage],
+) -> list[Message]:
+    """Insert messages and all of their content blocks in a single statement and commit once.
+
+    One round trip: a multi-row INSERT ... RETURNING for the messages, feeding a multi-row
+    INSERT of the blocks through a CTE.
+    """
+    created = [Message(task_id=task_id, role=role, message_order=message_order) for role, message_order, _ in messages]
+    block_rows = [
+        row
+        for message, (_, _, content_blocks) in zip(created, messages)
+        for sequence_number, block in enumerate(content_blocks)
+        if (row := _content_block_row(message.external_id, sequence_number, block)) is not None
+    ]
+
+    inserted_messages = (
+        insert(Message)
+        .values([
+            {
+                "external_id": message.external_id,
+                "task_id": message.task_id,
+                "role": message.role,
+                "message_order": message.message_order,
+                "created_at": message.created_at,
+            }
+            for message in created
+        ])
+        .returning(Message.id, Message.external_id) # type: ignore
+        .cte("inserted_messages")
     )
-    session.add(message)
+    query = select(inserted_messages.c.id, inserted_messages.c.external_id)
+    if block_rows:
+        blocks = values(
+            column("external_message_id", String),
+            column("block_type", String),
+            column("sequence_number", Integer),
+            column("tool_id", String),
+            column("tool_name", String),
+            column("content", JSON),
+            column("is_error", Boolean),
+            name="blocks",
+        ).data(block_rows)
+        inserted_blocks = insert(ContentBlock).from_select(
+            ["message_id", "block_type", "sequence_number", "tool_id", "tool_name", "content", "is_error"],
+            core_select(
+                inserted_messages.c.id,
+                blocks.c.block_type,
+                blocks.c.sequence_number,
+                blocks.c.tool_id,
+                blocks.c.tool_name,
+                blocks.c.content,
+                blocks.c.is_error,
+            ).join(inserted_messages, inserted_messages.c.external_id == blocks.c.external_message_id),
+        ).cte("inserted_blocks")
+        query = query.add_cte(inserted_blocks)
+
+    ids = {external_id: id for id, external_id in (await session.exec(query)).all()}
     await session.commit()
-    await session.refresh(message)
-    return message
+    for message, (role, _, content_blocks) in zip(created, messages):
+        message.id = ids[message.external_id]
+        history_cache.append(task_id, message.id, _message_param(role, content_blocks))
+    return created
 
 
-async def save_content_blocks(
+def _message_param(role: Literal["user", "assistant"], content_blocks: Sequence[ContentBlockModel]) -> MessageParam | None:
+    """The param get_message_params_for_task would load for these blocks, or None if none get stored"""
+    content = [create_anthropic_message_content(block) for block in content_blocks]
+    return {"role": role, "content": content} if content else None
+
+
+async def create_message_with_blocks(
     session: AsyncSession,
-    message_id: int,
+    task_id: int,
+    role: Literal["user", "assistant"],
+    message_order: int,
     content_blocks: Sequence[ContentBlockModel],
+) -> Message:
+    return (await create_messages(session, task_id, [(role, message_order, content_blocks)]))[0]
+
+
+async def save_iteration(
+    session: AsyncSession,
+    task_id: int,
+    message_order: int,
+    assistant_blocks: Sequence[ContentBlockModel],
+    tool_result_blocks: Sequence[ContentBlockModel],
 ) -> None:
-    for sequence_number, block in enumerate(content_blocks):
-        if block.type == "text":
-            db_block = ContentBlock(
-                message_id=message_id,
-                block_type="text",
-                sequence_number=sequence_number,
-                content={"text": block.text},
-            )
-        elif block.type == "tool_input":
-            db_block = ContentBlock(
-                message_id=message_id,
-                block_type="tool_input",
-                sequence_number=sequence_number,
-                tool_id=block.tool_id,
-                tool_name=block.tool_name,
-                content={"tool_input": block.tool_input if isinstance(block.tool_input, str) else block.tool_input.model_dump()},
-            )
-        elif block.type == "tool_result":
-            db_block = ContentBlock(
-                message_id=message_id,
-                block_type="tool_result",
-                sequence_number=sequence_number,
-                tool_id=block.tool_id,
-                content={"tool_result": block.tool_result},
-                is_error=block.is_error,
-            )
-        else:
-            continue
-        session.add(db_block)
-    
-    await session.commit()
+    """Persist one agent loop iteration atomically, so a tool_use is never stored without its tool_result"""
+    messages: list[NewMessage] = []
+    if assistant_blocks:
+        messages.append(("assistant", message_order, assistant_blocks))
+    if tool_result_blocks:
+        messages.append(("user", message_order + 1, tool_result_blocks))
+    if messages:
+        await create_messages(session, task_id, messages)
+
+
+async def get_message_id(session: AsyncSession, task_id: int, external_id: str) -> int | None:
+    query = select(Message.id).where(Message.task_id == task_id, Message.external_id == external_id)
+    return (await session.exec(query)).first()
 
 
 async def get_messages_for_task(
     session: AsyncSession,
     task_id: int,
+    after_id: int | None = None,
 ) -> list[tuple[Message, list[ContentBlock]]]:
+    """Messages with their blocks in id order, optionally only those after a message"""
+    conditions = [col(Message.task_id) == task_id]
+    if after_id is not None:
+        conditions.append(col(Message.id) > after_id)
+    return await _get_messages_with_blocks(session, conditions)
+
+
+async def get_message_page(
+    session: AsyncSession,
+    task_id: int,
+    limit: int,
+    after_id: int | None = None,
+) -> tuple[list[tuple[Message, list[ContentBlock]]], int | None]:
+    """At most limit messages after after_id, and the id to continue after if the page is full.
+
+    The page is chosen by message id alone, so a message without blocks still counts towards it
+    and a short result never ends pagination early.
+    """
+    page_query = select(Message.id).where(Message.task_id == task_id)
+    if after_id is not None:
+        page_query = page_query.where(col(Message.id) > after_id)
+    page_ids = list((await session.exec(page_query.order_by(col(Message.id)).limit(limit))).all())
+    if not page_ids:
+        return [], None
+    messages = await _get_messages_with_blocks(session, [col(Message.id).in_(page_ids)])
+    return messages, page_ids[-1] if len(page_ids) == limit else None
+
+
+async def _get_messages_with_blocks(session: AsyncSession, conditions: list[Any]) -> list[tuple[Message, list[ContentBlock]]]:
     query = (
         select(Message, ContentBlock)
-        .where(Message.task_id == task_id)
+        .where(*conditions)
         .join(ContentBlock, ContentBlock.message_id == Message.id) # type: ignore
         .order_by(Message.id, ContentBlock.sequence_number) # type: ignore
     )
@@ -164,35 +306,68 @@ async def get_messages_for_task(
     return list(grouped.values())
 
 
+async def get_message_params_for_task(
+    session: AsyncSession,
+    task_id: int,
+) -> list[MessageParam]:
+    """The task's conversation as Anthropic message params, from the history cache when it is current.
+
+    Checking the cache costs one index-only count/max query; only a miss reloads the transcript.
+    """
+    count_query = select(func.count(col(Message.id)), func.max(col(Message.id))).where(Message.task_id == task_id)
+    message_count, last_message_id = (await session.exec(count_query)).one()
+    cached = history_cache.get(task_id, message_count, last_message_id)
+    if cached is not None:
+        return cached
+
+    messages_and_blocks = await get_messages_for_task(session, task_id)
+    message_params = [create_message_param_from_message(message, blocks) for message, blocks in messages_and_blocks]
+    history_cache.put(task_id, message_params, message_count, last_message_id)
+    return message_params
+
+
 async def get_tasks(
     session: AsyncSession,
     project_id: int,
+    limit: int | None = None,
+    before: tuple[datetime, int] | None = None,
 ) -> Sequence[Task]:
-    query = (
-        select(Task)
-        .where(Task.project_id == project_id)
-        .order_by(desc(Task.created_at))
-    )
+    """Newest first; before is the (created_at, id) keyset of the last task on the previous page"""
+    query = select(Task).where(Task.project_id == project_id)
+    if before is not None:
+        query = query.where(tuple_(Task.created_at, Task.id) < tuple_(*before))
+    query = query.order_by(desc(Task.created_at), desc(Task.id))
+    if limit is not None:
+        query = query.limit(limit)
     return (await session.exec(query)).all()
 
 
+VALID_STATUS_TRANSITIONS: dict[str, list[str]] = {
+    "running": ["pending_review"],
+    "pending_review": ["running"],
+    "completed": [],  # completed is final
+}
+
+
 async def update_status(
     session: AsyncSession,
     task_id: int,
     status: Literal["running", "pending_review", "completed"],
-) -> None:
-    query = select(Task).where(Task.id == task_id)
-    task = (await session.exec(query)).one()
-    current_status = task.status
-    valid_transitions = {
-        "running": ["pending_review"],
-        "pending_review": ["running"],
-        "completed": []  # completed is final
-    }
-    
-    if status not in valid_transitions.get(current_status, []):
-        print(f"Warning: Invalid status transition from {current_status} to {status} for task {task_id}")
-        return
-    
-    task.status = status
-    await session.commit()
\ No newline at end of file
+) -> bool:
+    """Move the task to status if the transition is valid, as one compare-and-set UPDATE.
+
+    The allowed source statuses are part of the WHERE clause, so concurrent flows cannot both
+    apply a transition based on the same stale status. Returns whether the status changed.
+    """
+    allowed_from = [current for current, targets in VALID_STATUS_TRANSITIONS.items() if status in targets]
+    query = (
+        update(Task)
+        .where(col(Task.id) == task_id, col(Task.status).in_(allowed_from))
+        .values(status=status)
+        .returning(col(Task.id))
+    )
+    updated = (await session.exec(query)).first() is not None
+    await session.commit()
+    if not updated:
+        print(f"Warning: Invalid status transition to {status} for task {task_id}")
+    return updated
\ No newline at end of file
@@ -1,3 +1,4 @@
+from typing import Literal
 from api.settings import GlobalConfig
 
 REPO_PATH = "/tmp/repo"
@@ -5,6 +6,29 @@ REPO_PATH = "/tmp/repo"
 
 class Config(GlobalConfig):
     e2b_api_key: str
+    sandbox_heartbeat_flush_seconds: float = 5
+    sandbox_idle_minutes: int = 5
+    event_buffer_size: int = 5_000
+    event_buffer_max_bytes: int = 8 * 1024 * 1024
+    event_hub_ttl_seconds: int = 600
+    event_hub_sweep_interval_seconds: int = 60
+    event_bus: Literal["memory", "postgres"] = "memory"
+    sse_coalesce_window_ms: int = 30
+    sse_coalesce_max_bytes: int = 4_096
+    history_cache_max_bytes: int = 64 * 1024 * 1024
+    task_access_cache_size: int = 10_000
+    task_access_cache_ttl_seconds: int = 30
+    context_budget_tokens: int = 120_000
+    context_target_tokens: int = 80_000
+    context_keep_recent_messages: int = 6
+    bash_sessions_per_sandbox: int = 4
+    bash_idle_timeout_seconds: float = 15
+    bash_max_timeout_seconds: float = 120
+    setup_command_max_timeout_seconds: float = 600
+    job_max_wait_seconds: float = 60
+    job_output_max_bytes: int = 32_000
+    tool_output_delta_interval_ms: int = 250
+    tool_output_delta_max_chars: int = 64_000
 
 
 config = Config()
\ No newline at end of file
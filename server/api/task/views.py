@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from typing import Annotated
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header, Query, Response
 from fastapi.responses import StreamingResponse
 from api.auth.dependencies import AuthenticatedUserId
 import api.project.service as project_service
@@ -7,10 +8,13 @@ from api.llm.service import generate_title
 from api.database.dependencies import DbSession, async_session
 import api.task.queue_service as queue_service
 from api.database.models import Task
-from .models import TaskCreate, TaskPublic, TaskEvent, TextBlock, MessagePublic, MessageCreate, create_message_param_from_message
+from api.database.utils import encode_cursor, decode_cursor
+from .models import TaskCreate, TaskPublic, TaskEvent, TextBlock, MessagePublic, MessageCreate
 from .flows import start_task_flow, run_agent_flow
+from .dependencies import OwnedTask, AuthorizedTask
 from api.agent_tools.executor import SandboxExecutor
 from api.agent_tools.tools import AgentToolbox
+from api.agent_tools.dispatch import ToolDispatcher
 from api.agent_tools.models import ToolInputBlock, ToolResultBlock
 
 router = APIRouter(prefix="/task")
@@ -34,11 +38,8 @@ async def create_task(
     )
     
     # Save initial user message to database
-    user_message = await task_service.create_message(
-        db, task.id, "user", 0
-    )
-    await task_service.save_content_blocks(
-        db, user_message.id, [TextBlock(text=task_data.description)]
+    await task_service.create_message_with_blocks(
+        db, task.id, "user", 0, [TextBlock(text=task_data.description)]
     )
     
     async def generate_task_title_background(task: Task) -> None:
@@ -54,37 +55,24 @@ async def create_task(
         task_data.gh_access_token,
         task_data.voice_mode
     )
-    queue_service.create(task.id)
+    await queue_service.create(task.id)
     return task.external_id
 
 
 @router.get("/{task_id}")
-async def get_task(
-    task_id: str,
-    user_id: AuthenticatedUserId,
-    db: DbSession
-) -> TaskPublic:
-    task = await task_service.get(db, task_id)
-    project = await project_service.get_by_id(db, task.project_id)
-    if project.user_id != user_id:
-        raise HTTPException(status_code=403, detail="You are not allowed to access this task")
-    
+async def get_task(owned_task: OwnedTask) -> TaskPublic:
+    task, _ = owned_task
     return TaskPublic.from_task(task) 
 
 
 @router.post("/{task_id}/events")
 async def read_events(
-    task_id: str,
-    user_id: AuthenticatedUserId,
-    db: DbSession,
+    access: AuthorizedTask,
+    last_event_id: Annotated[str | None, Header()] = None,
 ) -> TaskEvent:
-    task = await task_service.get(db, task_id)
-    project = await project_service.get_by_id(db, task.project_id)
-    if project.user_id != user_id:
-        raise HTTPException(status_code=403, detail="You are not allowed to access this task")
-
+    resume_after = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
     return StreamingResponse(
-        queue_service.stream_response(task.id),
+        queue_service.stream_response(access.task_id, resume_after),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -95,69 +83,61 @@ async def read_events(
 
 @router.get("/{task_id}/messages")
 async def get_messages(
-    task_id: str,
-    user_id: AuthenticatedUserId,
+    access: AuthorizedTask,
     db: DbSession,
+    response: Response,
+    limit: Annotated[int | None, Query(ge=1, le=200)] = None,
+    cursor: str | None = None,
+    after: str | None = None,
 ) -> list[MessagePublic]:
-    task = await task_service.get(db, task_id)
-    project = await project_service.get_by_id(db, task.project_id)
-    if project.user_id != user_id:
-        raise HTTPException(status_code=403, detail="You are not allowed to access this task")
-    
-    messages_and_blocks = await task_service.get_messages_for_task(db, task.id)
+    """Oldest messages first. after is a message id the client already has; with a limit, a full page
+    sets the X-Next-Cursor header to pass back as cursor."""
+    try:
+        after_id = int(decode_cursor(cursor)[0]) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if after is not None:
+        after_message_id = await task_service.get_message_id(db, access.task_id, after)
+        if after_message_id is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        after_id = max(after_id or 0, after_message_id)
+    if limit is None:
+        messages_and_blocks = await task_service.get_messages_for_task(db, access.task_id, after_id)
+    else:
+        messages_and_blocks, next_after_id = await task_service.get_message_page(db, access.task_id, limit, after_id)
+        if next_after_id is not None:
+            response.headers["X-Next-Cursor"] = encode_cursor(next_after_id)
     return [MessagePublic.from_message_and_blocks(message, blocks) for message, blocks in messages_and_blocks]
 
 
 @router.post("/{task_id}/messages")
 async def create_message(
-    task_id: str,
-    user_id: AuthenticatedUserId,
+    owned_task: OwnedTask,
     db: DbSession,
     message_data: MessageCreate,
     background_tasks: BackgroundTasks,
 ) -> None:
-    task = await task_service.get(db, task_id)
-    project = await project_service.get_by_id(db, task.project_id)
-    if project.user_id != user_id:
-        raise HTTPException(status_code=403, detail="You are not allowed to access this task")
-    
-    queue_service.create(task.id)
-    message = await task_service.create_message(db, task.id, "user", 0)
-    await task_service.save_content_blocks(db, message.id, [TextBlock(text=message_data.text)])
-    messages_and_blocks = await task_service.get_messages_for_task(db, task.id)
-    message_params = [
-        create_message_param_from_message(message, blocks) 
-        for message, blocks in messages_and_blocks
-    ]
-    background_tasks.add_task(run_agent_flow, task, message_params, project.rules_file_path)
+    task, project = owned_task
+    await queue_service.create(task.id)
+    await task_service.create_message_with_blocks(db, task.id, "user", 0, [TextBlock(text=message_data.text)])
+    message_params = await task_service.get_message_params_for_task(db, task.id)
+    background_tasks.add_task(run_agent_flow, task, message_params, project)
 
 
 @router.post("/{task_id}/tool-calls")
 async def execute_tool_calls(
-    task_id: str,
     tool_calls: list[ToolInputBlock],
-    user_id: AuthenticatedUserId,
+    owned_task: OwnedTask,
     db: DbSession,
 ) -> list[ToolResultBlock]:
     """Execute tool calls for voice mode - accepts external task ID and array of tool calls"""
-    task = await task_service.get(db, task_id)
-    project = await project_service.get_by_id(db, task.project_id)
-    if project.user_id != user_id:
-        raise HTTPException(status_code=403, detail="You are not allowed to access this task")
-    
+    task, _ = owned_task
     results: list[ToolResultBlock] = []
     async with SandboxExecutor(task.id, db, task.sandbox_id) as executor:
-        toolbox = AgentToolbox(executor)
+        dispatcher = ToolDispatcher(AgentToolbox(executor))
         for tool_input_block in tool_calls:
-            try:
-                tool_result = await toolbox.execute_tool(tool_input_block)
-                result_block = ToolResultBlock.from_tool_result(tool_result)
-                results.append(result_block)
-            except Exception as e:
-                results.append(ToolResultBlock(
-                    tool_id=tool_input_block.tool_id,
-                    tool_result=f"Error: {str(e)}",
-                    is_error=True
-                ))
+            dispatcher.dispatch(tool_input_block)
+        async for _, tool_result in dispatcher.results():
+            results.append(ToolResultBlock.from_tool_result(tool_result))
     
     return results
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""add indexes for task, message and content block hot paths
+
+Revision ID: 5e3b7c91d0a4
+Revises: cda405101112
+Create Date: 2026-10-18 14:02:11.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel             # NEW
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e3b7c91d0a4'
+down_revision: Union[str, None] = 'cda405101112'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_message_task_id_id', 'message', ['task_id', 'id'], unique=False)
+    op.create_index('ix_contentblock_message_id_sequence_number', 'contentblock', ['message_id', 'sequence_number'], unique=False)
+    op.create_index('ix_task_project_id_created_at', 'task', ['project_id', sa.text('created_at DESC')], unique=False)
+    op.create_index(
+        'ix_task_running_sandbox_last_used_at',
+        'task',
+        ['last_used_at'],
+        unique=False,
+        postgresql_where=sa.text("sandbox_state = 'running' AND sandbox_id IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_task_running_sandbox_last_used_at', table_name='task', postgresql_where=sa.text("sandbox_state = 'running' AND sandbox_id IS NOT NULL"))
+    op.drop_index('ix_task_project_id_created_at', table_name='task')
+    op.drop_index('ix_contentblock_message_id_sequence_number', table_name='contentblock')
+    op.drop_index('ix_message_task_id_id', table_name='message')
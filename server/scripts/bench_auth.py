@@ -0,0 +1,78 @@
+"""Microbenchmark: per-request cost of get_authenticated_user_id.
+
+Signs a token with a throwaway RSA key served as the JWKS, then compares the original
+path (parse, scan the JWKS, construct the key, verify) with the cached one for a repeat
+request carrying the same token.
+
+Usage: uv run python -m scripts.bench_auth [requests]
+"""
+import sys
+import json
+import time
+import asyncio
+from typing import Any, Awaitable, Callable
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt, jwk
+from starlette.requests import Request
+import api.auth.dependencies as auth
+from api.auth.jwks_service import jwks_refresher
+from api.auth.settings import config
+
+KID = "bench"
+
+
+def _make_token_and_jwks() -> tuple[str, dict[str, Any]]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = {**jwk.construct(public_pem, "RS256").to_dict(), "kid": KID, "alg": "RS256"}
+    claims = {"sub": "user_bench", "aud": config.stack_project_id, "exp": int(time.time()) + 3600}
+    token = jwt.encode(claims, private_pem.decode(), algorithm="RS256", headers={"kid": KID})
+    return token, {"keys": [public_jwk]}
+
+
+def _request(token: str) -> Request:
+    header = json.dumps({"accessToken": token}).encode()
+    return Request({"type": "http", "headers": [(b"x-stack-auth", header)]})
+
+
+async def _uncached(request: Request, jwks: dict[str, Any]) -> str:
+    """The dependency as it was: every step on every request"""
+    access_token = json.loads(request.headers["x-stack-auth"])["accessToken"]
+    unverified_header = jwt.get_unverified_header(access_token)
+    key_data = next(k for k in jwks["keys"] if k["kid"] == unverified_header["kid"])
+    key = jwk.construct(key_data)
+    payload = jwt.decode(access_token, key, algorithms=[key_data["alg"]], audience=config.stack_project_id)
+    return payload["sub"] # type: ignore
+
+
+async def _time(name: str, count: int, run: Callable[[], Awaitable[str]]) -> None:
+    start = time.perf_counter()
+    for _ in range(count):
+        await run()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>22}: {elapsed / count * 1e6:>9.1f} us/request")
+
+
+async def main(count: int) -> None:
+    token, jwks = _make_token_and_jwks()
+    jwks_refresher.load(jwks)  # keep the benchmark off the network
+    request = _request(token)
+
+    await _time("uncached", count, lambda: _uncached(request, jwks))
+
+    async def new_token() -> str:
+        auth._verified_tokens.clear()
+        return await auth.get_authenticated_user_id(request)
+
+    await _time("cached key, new token", count, new_token)
+    await _time("repeat token", count, lambda: auth.get_authenticated_user_id(request))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000))
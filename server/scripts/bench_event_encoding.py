@@ -0,0 +1,58 @@
+"""Microbenchmark: SSE frame encoding with pydantic per frame vs. pre-encoded events.
+
+Usage: uv run python -m scripts.bench_event_encoding [events] [subscribers]
+"""
+import sys
+import time
+from api.task.models import TaskEvent, TextDeltaEvent, MessageStartEvent, MessageStopEvent
+from api.agent_tools.models import ToolInputBlock, ToolResultBlock
+from api.task.encoding import encode_event
+
+
+def _sample_events(count: int) -> list[TaskEvent]:
+    """Roughly the mix of one agent turn: mostly text deltas, a few tool calls"""
+    events: list[TaskEvent] = [MessageStartEvent()]
+    for i in range(count - 4):
+        events.append(TextDeltaEvent(text=f"token {i} with some \"quoted\" text\n"))
+    events.append(ToolInputBlock(tool_id="toolu_1", tool_name="bash", tool_input={"command": "ls -la", "description": "List files"}))
+    events.append(ToolResultBlock(tool_id="toolu_1", tool_result="total 0\n" * 50))
+    events.append(MessageStopEvent())
+    return events
+
+
+def _pydantic_per_frame(events: list[TaskEvent], subscribers: int) -> None:
+    for _ in range(subscribers):
+        for seq, event in enumerate(events):
+            f"id: {seq}\ndata: {event.model_dump_json()}\n\n".encode()
+
+
+def _pre_encoded(events: list[TaskEvent], subscribers: int) -> None:
+    encoded = [encode_event(event) for event in events]
+    for _ in range(subscribers):
+        for seq, event in enumerate(encoded):
+            b"id: %d\ndata: %b\n\n" % (seq, event.data)
+
+
+def main(count: int, subscribers: int) -> None:
+    events = _sample_events(count)
+    for name, bench in [("pydantic per frame", _pydantic_per_frame), ("pre-encoded", _pre_encoded)]:
+        start = time.perf_counter()
+        bench(events, subscribers)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>20}: {count * subscribers / elapsed:>12,.0f} events/s")
+
+    encoded_only = [event for event in events if isinstance(event, TextDeltaEvent)]
+    start = time.perf_counter()
+    for event in encoded_only:
+        encode_event(event)
+    hand_rolled = time.perf_counter() - start
+    start = time.perf_counter()
+    for event in encoded_only:
+        event.model_dump_json()
+    pydantic = time.perf_counter() - start
+    print(f"text_delta encode: hand-rolled {len(encoded_only) / hand_rolled:,.0f}/s, pydantic {len(encoded_only) / pydantic:,.0f}/s")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [100_000, 3][len(args):]))
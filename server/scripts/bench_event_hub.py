@@ -0,0 +1,52 @@
+"""Fan-out benchmark: 1 producer and N subscribers per task on the in-memory event hub.
+
+Usage: uv run python -m scripts.bench_event_hub [events] [subscribers] [tasks]
+"""
+import sys
+import time
+import asyncio
+import api.task.queue_service as queue_service
+from api.task.models import TextDeltaEvent
+
+
+async def _subscriber(task_id: int, events: int, latencies: list[float], sent_at: dict[tuple[int, int], float]) -> None:
+    received = 0
+    async for seq, _ in queue_service.stream(task_id):
+        latencies.append(time.perf_counter() - sent_at[task_id, seq])
+        received += 1
+        if received == events:
+            return
+
+
+async def _producer(task_id: int, events: int, sent_at: dict[tuple[int, int], float]) -> None:
+    for i in range(events):
+        sent_at[task_id, queue_service._hubs[task_id].next_seq] = time.perf_counter()
+        await queue_service.push(task_id, TextDeltaEvent(text=f"token {i} "))
+        if i % 10 == 0:
+            await asyncio.sleep(0)
+
+
+async def main(events: int, subscribers: int, tasks: int) -> None:
+    latencies: list[float] = []
+    sent_at: dict[tuple[int, int], float] = {}
+    readers: list[asyncio.Task[None]] = []
+    for task_id in range(tasks):
+        await queue_service.create(task_id)
+        readers += [asyncio.create_task(_subscriber(task_id, events, latencies, sent_at)) for _ in range(subscribers)]
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[_producer(task_id, events, sent_at) for task_id in range(tasks)])
+    await asyncio.gather(*readers)
+    elapsed = time.perf_counter() - start
+
+    deliveries = events * subscribers * tasks
+    latencies.sort()
+    print(f"tasks={tasks} subscribers/task={subscribers} events/task={events}")
+    print(f"{deliveries:,} deliveries in {elapsed:.3f}s ({deliveries / elapsed:,.0f}/s)")
+    print(f"latency p50={latencies[len(latencies) // 2] * 1e3:.2f}ms p99={latencies[int(len(latencies) * 0.99)] * 1e3:.2f}ms")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [10_000, 100, 1][len(args):])))
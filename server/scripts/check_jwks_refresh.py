@@ -0,0 +1,112 @@
+"""Behaviour check for JwksRefresher against a local stub JWKS server.
+
+Covers the cases a slow or rotating identity provider produces:
+- an unknown kid triggers one fetch, however many requests wait on it
+- known keys keep being served while a slow refresh is in flight
+- a failing provider leaves the previous key set in place
+- random unknown kids inside the cooldown do not reach the provider
+
+Usage: uv run python -m scripts.check_jwks_refresh
+"""
+import sys
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk
+from api.auth.jwks_service import JwksRefresher
+
+
+def _public_jwk(kid: str) -> dict[str, Any]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return {**jwk.construct(public_pem, "RS256").to_dict(), "kid": kid, "alg": "RS256"}
+
+
+class StubJwks:
+    def __init__(self) -> None:
+        self.keys = [_public_jwk("k1")]
+        self.delay_seconds = 0.0
+        self.status = 200
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                stub.requests += 1
+                time.sleep(stub.delay_seconds)
+                body = json.dumps({"keys": stub.keys}).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/jwks.json"
+
+
+def check(name: str, ok: bool) -> bool:
+    print(f"{'ok' if ok else 'FAIL':>4}  {name}")
+    return ok
+
+
+async def main() -> None:
+    stub = StubJwks()
+    refresher = JwksRefresher(stub.url, refresh_interval_seconds=3600, unknown_kid_cooldown_seconds=0.5)
+    await refresher.start()
+    results = [check("initial fetch on start", stub.requests == 1 and "k1" in refresher._keys)]
+
+    # Rotation: 50 requests carrying the new kid share one fetch
+    stub.keys.append(_public_jwk("k2"))
+    stub.delay_seconds = 0.2
+    keys = await asyncio.gather(*(refresher.get_key("k2") for _ in range(50)))
+    results.append(check("unknown kid fetched once for 50 waiters", stub.requests == 2 and len(keys) == 50))
+
+    # Stale-while-revalidate: a slow refresh does not delay known keys
+    stub.delay_seconds = 1.0
+    refresh = asyncio.create_task(refresher.refresh())
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await refresher.get_key("k1")
+    results.append(check("known key served during slow refresh", time.perf_counter() - start < 0.05))
+    await refresh
+
+    # A failing provider keeps the old key set
+    stub.delay_seconds = 0.0
+    stub.status = 500
+    try:
+        await refresher.refresh()
+        failed = False
+    except Exception:
+        failed = True
+    results.append(check("failed refresh keeps previous keys", failed and {"k1", "k2"} <= refresher._keys.keys()))
+
+    # Unknown kids inside the cooldown are rejected without another fetch
+    stub.status = 200
+    await asyncio.sleep(0.5)
+    before = stub.requests
+    for kid in ["x1", "x2", "x3"]:
+        try:
+            await refresher.get_key(kid)
+        except KeyError:
+            pass
+    results.append(check("unknown kids rate limited", stub.requests == before + 1))
+
+    await refresher.stop()
+    stub.server.shutdown()
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
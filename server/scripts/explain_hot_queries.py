@@ -0,0 +1,147 @@
+"""Query-plan regression check for the hot task/message/content block queries.
+
+Runs the real task_service queries, captures the SQL they send, and asserts with
+EXPLAIN that Postgres answers them from the expected indexes. Point API_DATABASE_URL
+at a migrated database; --seed first inserts ~1M content blocks so the planner has a
+realistic table size to work with. Everything runs in one transaction that is rolled
+back at the end, so the seed rows never outlive the check.
+
+Usage: uv run python -m scripts.explain_hot_queries [--seed]
+"""
+import sys
+import json
+import asyncio
+from typing import Any, Awaitable, Callable
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel.ext.asyncio.session import AsyncSession
+from api.database.dependencies import engine
+import api.task.service as task_service
+
+SEED_MARKER = "explain-seed"
+PROJECTS = 100
+TASKS_PER_PROJECT = 100
+MESSAGES_PER_TASK = 10
+BLOCKS_PER_MESSAGE = 10
+
+SEED_STATEMENTS = [
+    """
+    INSERT INTO project (external_id, user_id, repo_id, repo_name, repo_html_url, repo_clone_url, rules_file_path, setup_script_path, created_at)
+    SELECT gen_random_uuid()::text, :marker, g, 'repo', '', '', '', '', now()
+    FROM generate_series(1, :projects) g
+    """,
+    """
+    INSERT INTO task (external_id, project_id, title, description, status, sandbox_id, sandbox_state, last_used_at, created_at)
+    SELECT gen_random_uuid()::text, p.id, '', :marker, 'pending_review', 'sbx',
+        CASE WHEN g % 50 = 0 THEN 'running' ELSE 'paused' END,
+        now() - make_interval(mins => g), now() - make_interval(secs => g)
+    FROM project p, generate_series(1, :tasks_per_project) g
+    WHERE p.user_id = :marker
+    """,
+    """
+    INSERT INTO message (external_id, task_id, role, message_order, created_at)
+    SELECT gen_random_uuid()::text, t.id, CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END, g, now()
+    FROM task t, generate_series(0, :messages_per_task - 1) g
+    WHERE t.description = :marker
+    """,
+    """
+    INSERT INTO contentblock (message_id, block_type, sequence_number, content, is_error, created_at)
+    SELECT m.id, 'text', g, json_build_object('text', repeat('x', 200)), false, now()
+    FROM message m JOIN task t ON t.id = m.task_id, generate_series(0, :blocks_per_message - 1) g
+    WHERE t.description = :marker
+    """,
+    "ANALYZE project, task, message, contentblock",
+]
+
+
+async def seed(connection: AsyncConnection) -> None:
+    params = {
+        "marker": SEED_MARKER,
+        "projects": PROJECTS,
+        "tasks_per_project": TASKS_PER_PROJECT,
+        "messages_per_task": MESSAGES_PER_TASK,
+        "blocks_per_message": BLOCKS_PER_MESSAGE,
+    }
+    for statement in SEED_STATEMENTS:
+        await connection.execute(text(statement), params)
+    print(f"Seeded {PROJECTS * TASKS_PER_PROJECT * MESSAGES_PER_TASK * BLOCKS_PER_MESSAGE:,} content blocks")
+
+
+def _plan_indexes(plan: dict[str, Any]) -> set[str]:
+    indexes = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        indexes |= _plan_indexes(child)
+    return indexes
+
+
+async def check(connection: AsyncConnection, name: str, run: Callable[[AsyncSession], Awaitable[Any]], expected: set[str]) -> bool:
+    captured: list[tuple[str, Any]] = []
+
+    def capture(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        async with AsyncSession(bind=connection) as session:
+            await run(session)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    statement, parameters = captured[-1]
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    used = _plan_indexes(plan[0]["Plan"])
+    missing = expected - used
+    print(f"{'ok' if not missing else 'FAIL':>4}  {name}: uses {sorted(used) or 'no indexes'}")
+    return not missing
+
+
+async def _sample_task(connection: AsyncConnection, seeded: bool) -> tuple[int, int]:
+    """The newest seeded task, or without a seed the newest task already in the database"""
+    query = "SELECT id, project_id FROM task {} ORDER BY id DESC LIMIT 1".format("WHERE description = :marker" if seeded else "")
+    task_id, project_id = (await connection.execute(text(query), {"marker": SEED_MARKER})).one()
+    return task_id, project_id
+
+
+async def run_checks(connection: AsyncConnection, should_seed: bool) -> list[bool]:
+    if should_seed:
+        await seed(connection)
+    task_id, project_id = await _sample_task(connection, should_seed)
+    return [
+        await check(
+            connection,
+            "get_messages_for_task",
+            lambda session: task_service.get_messages_for_task(session, task_id),
+            {"ix_message_task_id_id", "ix_contentblock_message_id_sequence_number"},
+        ),
+        await check(
+            connection,
+            "get_tasks",
+            lambda session: task_service.get_tasks(session, project_id),
+            {"ix_task_project_id_created_at"},
+        ),
+        await check(
+            connection,
+            "get_idle_sandboxes",
+            lambda session: task_service.get_idle_sandboxes(session, 5),
+            {"ix_task_running_sandbox_last_used_at"},
+        ),
+    ]
+
+
+async def main(should_seed: bool) -> None:
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        try:
+            results = await run_checks(connection, should_seed)
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main("--seed" in sys.argv[1:]))
@@ -0,0 +1,111 @@
+"""Fuzz the executor's completion scanner: feed framed shell output split at every boundary and at random,
+and check the command's output and exit code always come out the same.
+
+Usage: uv run python -m scripts.fuzz_completion_scanner [random_rounds]
+"""
+import random
+import subprocess
+import sys
+import time
+from api.agent_tools.executor import CompletionScanner
+
+MARKER = "FLEET_abc123"
+
+
+def _stream(output: str, exit_code: int) -> str:
+    """What the shell prints for a framed command, with noise around the frames"""
+    return (
+        "late output from the previous command\nFLEET_old:end:0\nFLEET_abc12"  # partial begin frame
+        f"\n{MARKER}:begin\n"
+        f"{output}"
+        f"{MARKER}:end:{exit_code}\n"
+        "a background job printing after the command finished\n"
+    )
+
+
+OUTPUTS = [
+    "",
+    "hello\n",
+    "no trailing newline",
+    f"near misses: {MARKER}:begin again\n{MARKER}:en\n{MARKER}:end\nFLEET_abc123:\n\nFLEET_",
+    "unicode ünïcödé ✓\n" * 3,
+]
+
+
+def _scan(chunks: list[str]) -> tuple[str, int | None, bool]:
+    scanner = CompletionScanner(MARKER)
+    output = "".join(scanner.feed(chunk) for chunk in chunks)
+    return output, scanner.exit_code, scanner.complete
+
+
+def _check(chunks: list[str], output: str, exit_code: int) -> None:
+    result = _scan(chunks)
+    assert result == (output, exit_code, True), (chunks, result)
+
+
+def fuzz_splits(random_rounds: int) -> int:
+    checked = 0
+    rng = random.Random(0)
+    for output in OUTPUTS:
+        for exit_code in (0, 1, 127):
+            stream = _stream(output, exit_code)
+            # Every single split point, then one character at a time
+            for split in range(len(stream) + 1):
+                _check([stream[:split], stream[split:]], output, exit_code)
+                checked += 1
+            _check(list(stream), output, exit_code)
+            # Every pair of split points
+            for first in range(len(stream) + 1):
+                for second in range(first, len(stream) + 1):
+                    _check([stream[:first], stream[first:second], stream[second:]], output, exit_code)
+                    checked += 1
+            for _ in range(random_rounds):
+                cuts = sorted(rng.sample(range(len(stream) + 1), rng.randint(1, 10)))
+                _check([stream[a:b] for a, b in zip([0] + cuts, cuts + [len(stream)])], output, exit_code)
+                checked += 1
+    return checked
+
+
+def check_incomplete() -> None:
+    stream = _stream("output\n", 0)
+    end = stream.index(f"{MARKER}:end:")
+    for cut in range(end + len(f"{MARKER}:end:0")):
+        _, exit_code, complete = _scan([stream[:cut]])
+        assert not complete and exit_code is None, cut
+
+
+def check_shell() -> None:
+    """Run real framed commands through bash and scan what it prints"""
+    for command, output, exit_code in [
+        ("echo hi", "hi\n", 0),
+        ("printf 'no newline'", "no newline", 0),
+        ("echo out; false", "out\n", 1),
+        ("(exit 42)", "", 42),
+        ("cat", "", 0),
+        ("read line; echo \"got $line\"", "got \n", 0),
+        ("python3 -c 'import sys; print(len(sys.stdin.read()))'", "0\n", 0),
+        ("cd /tmp\npwd", "/tmp\n", 0),
+    ]:
+        scanner = CompletionScanner(MARKER)
+        stdout = subprocess.run(["bash"], input=scanner.frame(command), capture_output=True, text=True).stdout
+        _check(list(stdout), output, exit_code)
+
+
+def time_linear() -> None:
+    for size in (100_000, 1_000_000):
+        stream = _stream("x\n" * (size // 2), 0)
+        start = time.perf_counter()
+        _scan([stream[i:i + 7] for i in range(0, len(stream), 7)])
+        print(f"{size:>9} chars in 7-char chunks: {time.perf_counter() - start:.3f}s")
+
+
+def main(random_rounds: int) -> None:
+    checked = fuzz_splits(random_rounds)
+    check_incomplete()
+    check_shell()
+    print(f"ok: {checked} chunkings")
+    time_linear()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000)
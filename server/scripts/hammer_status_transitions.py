@@ -0,0 +1,72 @@
+"""Concurrency check for task_service.update_status.
+
+Many coroutines, each on its own connection, race to flip one task between running and
+pending_review. Since every transition is a compare-and-set UPDATE, the applied transitions
+must strictly alternate: the number of successful flips to each status can differ by at most
+one, and the final status must match. Point API_DATABASE_URL at a local, migrated database.
+
+Usage: uv run python -m scripts.hammer_status_transitions [workers] [attempts_per_worker]
+"""
+import sys
+import random
+import asyncio
+from collections import Counter
+from typing import Literal
+from sqlalchemy import text
+from api.database.dependencies import engine, async_session
+import api.task.service as task_service
+
+MARKER = "hammer-status"
+
+
+async def _create_task() -> int:
+    async with engine.begin() as connection:
+        project_id = (await connection.execute(text(
+            "INSERT INTO project (external_id, user_id, repo_id, repo_name, repo_html_url, repo_clone_url, rules_file_path, setup_script_path, created_at) "
+            "VALUES (gen_random_uuid()::text, :marker, 0, 'repo', '', '', '', '', now()) RETURNING id"
+        ), {"marker": MARKER})).scalar_one()
+        task_id: int = (await connection.execute(text(
+            "INSERT INTO task (external_id, project_id, title, description, status, sandbox_state, created_at) "
+            "VALUES (gen_random_uuid()::text, :project_id, '', :marker, 'running', 'paused', now()) RETURNING id"
+        ), {"project_id": project_id, "marker": MARKER})).scalar_one()
+    return task_id
+
+
+async def _cleanup() -> None:
+    async with engine.begin() as connection:
+        await connection.execute(text("DELETE FROM task WHERE description = :marker"), {"marker": MARKER})
+        await connection.execute(text("DELETE FROM project WHERE user_id = :marker"), {"marker": MARKER})
+
+
+async def _worker(task_id: int, attempts: int, applied: Counter[str]) -> None:
+    statuses: list[Literal["running", "pending_review"]] = ["running", "pending_review"]
+    for _ in range(attempts):
+        status = random.choice(statuses)
+        async with async_session() as session:
+            if await task_service.update_status(session, task_id, status):
+                applied[status] += 1
+
+
+async def main(workers: int, attempts: int) -> None:
+    task_id = await _create_task()
+    applied: Counter[str] = Counter()
+    try:
+        await asyncio.gather(*(_worker(task_id, attempts, applied) for _ in range(workers)))
+        async with engine.connect() as connection:
+            final_status = (await connection.execute(text("SELECT status FROM task WHERE id = :id"), {"id": task_id})).scalar_one()
+    finally:
+        await _cleanup()
+        await engine.dispose()
+
+    # Starting from running, every applied flip to pending_review must precede one back to running
+    expected_final = "pending_review" if applied["pending_review"] > applied["running"] else "running"
+    ok = applied["pending_review"] - applied["running"] in (0, 1) and final_status == expected_final
+    print(f"{'ok' if ok else 'FAIL'}: {workers * attempts} attempts, applied {dict(applied)}, final status {final_status}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main_args = args + [50, 40][len(args):]
+    asyncio.run(main(*main_args))